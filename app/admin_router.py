@@ -0,0 +1,61 @@
+"""
+admin_router.py
+Endpoints de administración del backend (solo desde la misma máquina, salvo
+ADMIN_ALLOW_REMOTE=1): cambio del modelo de Whisper en caliente y estado del
+gobernador de memoria.
+"""
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+from app import governor, model_pool
+from app.inference import get_backend
+
+ADMIN_ALLOW_REMOTE = os.getenv("ADMIN_ALLOW_REMOTE", "0") == "1"
+LOCAL_HOSTS = ("127.0.0.1", "::1", "localhost")
+
+
+def require_local(request: Request):
+    if ADMIN_ALLOW_REMOTE:
+        return
+    host = request.client.host if request.client else None
+    if host not in LOCAL_HOSTS:
+        raise HTTPException(status_code=403, detail="Endpoint de administración solo disponible localmente")
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_local)])
+
+
+@router.get("/model")
+def get_model_status():
+    """Modelo por defecto actual, último cambio (tiempo de carga, memoria liberada) y réplicas."""
+    return {
+        "default_model": model_pool.get_default_model(),
+        "swap": model_pool.get_swap_status(),
+        "pools": model_pool.status()["pools"],
+    }
+
+
+@router.post("/model")
+def swap_model(name: str = Query(..., description="Modelo de Whisper: tiny, base, small, medium, large...")):
+    """
+    Carga `name` en background y lo pone como modelo por defecto cuando está listo,
+    sin reiniciar ni cortar transcripciones en curso. El avance se consulta en GET /admin/model.
+    """
+    if name not in get_backend().available_models():
+        raise HTTPException(status_code=400, detail=f"Modelo no soportado: {name}")
+    if name == model_pool.get_default_model():
+        raise HTTPException(status_code=400, detail=f"'{name}' ya es el modelo por defecto")
+    try:
+        return model_pool.swap_default_model(name)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/governor")
+def get_governor_status():
+    """
+    Presupuesto y uso de memoria, huella de cada modelo, transcripciones en curso con su
+    memoria proyectada y las últimas decisiones (admitido, demorado, rechazado, descargado).
+    """
+    return governor.get_status()
@@ -1,13 +1,25 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, BackgroundTasks
 from fastapi.responses import JSONResponse
 import shutil
+import zipfile
+from typing import List, Optional
 from pathlib import Path
-from fastapi import APIRouter, HTTPException
-from app.transcribe import router as transcribe_router
+from fastapi import APIRouter, HTTPException, Query, Response
+from app.transcribe import router as transcribe_router, DRAFT_MODEL, REFINE_MODEL
 from app.license_router import router as license_router
+from app.jobs_router import router as jobs_router
+from app.streaming import router as streaming_router
+from app.admin_router import router as admin_router
+from app.license_gate import LicenseGateMiddleware
+from app import ingest
+from app import storage
+from app import waveform
+from app import blobstore
+from app import executors
+from app.subtitles import segments_path
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import datetime
-import subprocess
 import sys
 import os
 import traceback
@@ -27,6 +39,10 @@ audio_router = APIRouter(prefix="/audio", tags=["audio"])
 AUDIO_DIR = BASE_DIR / "audio"
 AUDIO_DIR.mkdir(exist_ok=True)
 
+# Bloqueo por licencia de las rutas costosas (agregado antes que CORS para que
+# las respuestas 403 también lleven los headers CORS)
+app.add_middleware(LicenseGateMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -42,61 +58,245 @@ async def startup_event():
     from app.license_monitor import start_license_monitor
     start_license_monitor()
     print("✅ Monitor de licencia en background iniciado")
+    storage.start_storage_manager()
+    print("✅ Gestor de almacenamiento en background iniciado")
+    from app.jobs import start_job_dispatcher
+    start_job_dispatcher()
+    print("✅ Cola de trabajos en background iniciada")
+    from app.governor import start_governor
+    start_governor()
+    print("✅ Gobernador de memoria en background iniciado")
+    from app import workers
+    if workers.is_enabled():
+        print(f"✅ Inferencia en {workers.INFERENCE_WORKERS} procesos worker")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """Detiene los workers de inferencia al cerrar la app."""
+    from app.workers import shutdown_pool
+    shutdown_pool()
+    executors.shutdown()
 
 def get_audio_duration(file_path):
-    try:
-        cmd = [
-            str(BASE_DIR / "ffprobe.exe"),
-            "-v", "error",
-            "-show_entries", "format=duration",
-            "-of", "default=noprint_wrappers=1:nokey=1",
-            str(file_path)
-        ]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        output = result.stdout.strip()
-        duration = float(output) if output else None
-        return round(duration, 1) if duration is not None else None
-    except Exception as e:
-        print(f"Error obteniendo duración de {file_path}: {e}")
+    duration = ingest.cached_duration(file_path)
+    if duration is None:
+        print(f"Error obteniendo duración de {file_path}")
         return None
+    return round(duration, 1)
+
+def _list_entries():
+    # Audios cuyo original se eliminó tras la transcodificación siguen listándose por su nombre
+    entries = [(f.name, f) for f in AUDIO_DIR.glob("*") if f.is_file()]
+    entries += [(ingest.original_name(f), f) for f in ingest.list_canonical_only()]
+    return entries
+
+def _audio_entry(name: str, f: Path):
+    created_at = datetime.datetime.fromtimestamp(f.stat().st_ctime).strftime("%Y-%m-%d %H:%M")
+    # La copia canónica (si existe) se sondea más rápido que el original
+    duration = get_audio_duration(ingest.resolve_audio_path(name))
+    return {
+        "id": str(AUDIO_DIR / name),
+        "filename": name,
+        "created_at": created_at,
+        "duration": duration
+    }
 
 @audio_router.get("/list")
-def list_audios():
-    files = []
-    for f in AUDIO_DIR.glob("*"):
-        if f.is_file():
-            created_at = datetime.datetime.fromtimestamp(f.stat().st_ctime).strftime("%Y-%m-%d %H:%M")
-            duration = get_audio_duration(f)
-            files.append({
-                "id": str(f),
-                "filename": f.name,
-                "created_at": created_at,
-                "duration": duration
-            })
-    return {"audios": files}
+async def list_audios():
+    # Los sondeos de ffprobe corren en paralelo en el pool de E/S, no en el threadpool compartido
+    entries = await executors.run_io(_list_entries)
+    files = await asyncio.gather(*(executors.run_io(_audio_entry, name, f) for name, f in entries))
+    return {"audios": list(files)}
+
+@audio_router.get("/storage")
+def get_storage_status():
+    """Uso de disco, cuotas configuradas y resultado del último barrido de retención."""
+    return storage.get_storage_status()
+
+@audio_router.get("/canonical/{filename}")
+def get_canonical_report(filename: str):
+    """Reporte de la transcodificación canónica: bytes ahorrados y tiempos de decodificación."""
+    report = ingest.get_report(filename)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"No hay copia canónica para '{filename}'")
+    return report
+
+@audio_router.get("/peaks/{filename}")
+async def get_waveform_peaks(
+    filename: str,
+    width: int = Query(1000, ge=1, le=20000, description="Ancho en píxeles a dibujar"),
+    start: float = Query(0.0, ge=0, description="Inicio del tramo en segundos"),
+    end: float = Query(None, ge=0, description="Fin del tramo en segundos (por defecto, el final)"),
+    format: str = Query("json", description="json o binary (int8 intercalado mín/máx)"),
+):
+    """Picos mín/máx de la forma de onda al nivel de detalle adecuado para `width` píxeles."""
+    if format not in ("json", "binary"):
+        raise HTTPException(status_code=400, detail="Formato no soportado. Usa json o binary")
+    if not ingest.audio_exists(filename):
+        raise HTTPException(status_code=404, detail=f"Archivo de audio '{filename}' no encontrado")
+    # La primera consulta decodifica el audio completo: pool de trabajo pesado
+    result = await executors.run_heavy(waveform.get_peaks, filename, width, start, end)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Archivo de audio '{filename}' no encontrado")
+    peaks = result.pop("peaks")
+    if format == "binary":
+        headers = {f"X-Peaks-{key.replace('_', '-').title()}": str(value) for key, value in result.items()}
+        return Response(content=peaks.tobytes(), media_type="application/octet-stream", headers=headers)
+    result["min"] = peaks[:, 0].tolist()
+    result["max"] = peaks[:, 1].tolist()
+    return result
+
+ALLOWED_EXT = {'.mp3', '.wav', '.m4a', '.webm', '.ogg', '.aac', '.flac', '.amr'}
+MAX_BATCH_ITEMS = int(os.getenv("UPLOAD_MAX_BATCH_ITEMS", "1000"))
+
+def store_audio(source, filename: str, expected_size: int = None) -> Optional[str]:
+    """
+    Guarda un audio subido en AUDIO_DIR leyendo `source` por bloques. El SHA-256 se
+    calcula durante la copia: si el contenido ya existe no ocupa espacio extra.
+    Retorna el nombre de otro audio con el mismo contenido (o None).
+    Lanza storage.StorageFullError si no hay espacio u OSError si falla la escritura.
+    """
+    # Rechazar antes de escribir si no hay espacio o se supera la cuota
+    storage.check_upload_space(expected_size)
+    file_location = AUDIO_DIR / filename
+    # Un audio reemplazado invalida su copia canónica anterior
+    ingest.remove_canonical(filename)
+    # Escribir en .partial/ y mover al final: un disco lleno nunca deja un audio a medias
+    partial_location = storage.PARTIAL_DIR / filename
+    storage.PARTIAL_DIR.mkdir(exist_ok=True)
+    reader = blobstore.HashingReader(source)
+    try:
+        with open(partial_location, "wb") as buffer:
+            shutil.copyfileobj(reader, buffer)
+        duplicate_of = blobstore.commit(partial_location, filename, reader.hexdigest())
+    except OSError:
+        partial_location.unlink(missing_ok=True)
+        raise
+    storage.record_file(file_location)
+    waveform.remove_peaks(filename)
+    return duplicate_of
+
+def reuse_duplicate(source: str, filename: str) -> bool:
+    """
+    Copia a `filename` los resultados ya calculados para un audio idéntico `source`:
+    transcripción y segmentos (copias, se editan por separado), copia canónica y forma
+    de onda (hardlinks). Retorna True si había transcripción para reutilizar.
+    """
+    transcripts_dir = BASE_DIR / "transcripts"
+    source_base, target_base = Path(source).stem, Path(filename).stem
+    source_txt = transcripts_dir / f"{source_base}.txt"
+    if not source_txt.exists():
+        return False
+    if source_base != target_base:
+        for suffix in (".txt", ".segments.json"):
+            source_file = transcripts_dir / f"{source_base}{suffix}"
+            if source_file.exists():
+                target_file = transcripts_dir / f"{target_base}{suffix}"
+                shutil.copyfile(source_file, target_file)
+                storage.record_file(target_file)
+    derived = [(waveform.peaks_path(source), waveform.peaks_path(filename))]
+    if ingest.is_enabled():
+        derived.append((ingest.canonical_path(source), ingest.canonical_path(filename)))
+        derived.append((ingest.report_path(source), ingest.report_path(filename)))
+    for source_file, target_file in derived:
+        if source_file.exists():
+            blobstore.link_or_copy(source_file, target_file)
+            storage.record_file(target_file)
+    return True
+
+def _post_upload(filename: str):
+    if ingest.is_enabled() and not ingest.canonical_path(filename).exists():
+        ingest.transcode_to_canonical(filename)
+    # Después de la transcodificación: decodifica la copia canónica, más rápida
+    waveform.ensure_peaks(filename)
+
+def schedule_post_upload(background_tasks: BackgroundTasks, filename: str):
+    """
+    Transcodificación canónica y forma de onda, después de responder. Corren en el pool
+    heavy: como tarea sync irían al threadpool por defecto, el de las rutas livianas.
+    """
+    background_tasks.add_task(executors.run_heavy, _post_upload, filename)
 
 @audio_router.post("/upload")
-def upload_audio(file: UploadFile = File(...)):
-    allowed_ext = {'.mp3', '.wav', '.m4a', '.webm', '.ogg', '.aac', '.flac', '.amr'}
+async def upload_audio(
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...),
+    mode: str = Query("full", description="full, o draft: borrador rápido y refinado en background"),
+):
+    # Guardado y transcripción en el pool de trabajo pesado: no ocupan los hilos de las lecturas
+    return await executors.run_heavy(_upload_audio, background_tasks, file, mode)
+
+def _upload_audio(background_tasks: BackgroundTasks, file: UploadFile, mode: str):
+    if mode not in ("full", "draft"):
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa full o draft")
     ext = Path(file.filename).suffix.lower()
     # Validar que el archivo sea de tipo audio/*
     if not file.content_type.startswith('audio/'):
         raise HTTPException(status_code=415, detail=f"Tipo MIME no soportado: {file.content_type}. Debe ser audio/*.")
-    if ext not in allowed_ext:
+    if ext not in ALLOWED_EXT:
         # Permitir extensiones desconocidas pero advertir
         pass  # Opcional: puedes registrar un warning aquí
-    file_location = AUDIO_DIR / file.filename
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    from app.transcribe import transcribe_audio
     try:
-        transcript_file = transcribe_audio(file.filename)
+        duplicate_of = store_audio(file.file, file.filename, getattr(file, "size", None))
+    except storage.StorageFullError as e:
+        raise HTTPException(status_code=507, detail=str(e))
+    except OSError as e:
+        raise HTTPException(status_code=507, detail=f"No se pudo guardar el audio: {e}")
+    if duplicate_of and reuse_duplicate(duplicate_of, file.filename):
+        # Mismo contenido que un audio ya transcrito: no se vuelve a transcribir
+        schedule_post_upload(background_tasks, file.filename)
+        transcript_path = BASE_DIR / "transcripts" / f"{Path(file.filename).stem}.txt"
+        with open(transcript_path, "r", encoding="utf-8") as f:
+            transcript_text = f.read()
+        return JSONResponse(content={
+            "filename": file.filename,
+            "message": f"Audio idéntico a '{duplicate_of}': se reutilizó su transcripción",
+            "transcript": transcript_text,
+            "duplicate_of": duplicate_of,
+        })
+    schedule_post_upload(background_tasks, file.filename)
+    from app import jobs
+    from app.model_pool import POOL_WAIT_SECONDS, ModelPoolBusy, admission
+    from app.governor import MemoryBudgetExceeded
+    try:
+        # Registrado como trabajo: si el backend se cae a mitad, se re-encola al reiniciar
+        with admission(POOL_WAIT_SECONDS):
+            if mode == "draft":
+                result = jobs.run_inline(file.filename, model=DRAFT_MODEL, options={"draft": True})
+            else:
+                result = jobs.run_inline(file.filename)
+        transcript_file = result["transcript"]
         transcript_path = BASE_DIR / "transcripts" / transcript_file
         if transcript_path.exists():
             with open(transcript_path, "r", encoding="utf-8") as f:
                 transcript_text = f.read()
         else:
             transcript_text = None
+    except ModelPoolBusy:
+        # Sin capacidad libre: el audio queda guardado y su transcripción en cola
+        job = jobs.enqueue(file.filename)
+        return JSONResponse(content={
+            "filename": file.filename,
+            "message": "Archivo subido; la transcripción quedó en cola por alta demanda",
+            "transcript": None,
+            "job_id": job["id"],
+        }, status_code=202)
+    except MemoryBudgetExceeded as e:
+        # run_inline ya registró el fallo: la cola lo reintenta con backoff salvo que sea permanente
+        job = jobs.failed_job(e)
+        if job is not None and job["state"] == jobs.JobState.QUEUED:
+            return JSONResponse(content={
+                "filename": file.filename,
+                "message": f"Archivo subido; {e}. La transcripción quedó en cola",
+                "transcript": None,
+                "job_id": job["id"],
+            }, status_code=202)
+        return JSONResponse(content={
+            "filename": file.filename,
+            "message": f"Archivo subido pero no se transcribirá: {e}",
+            "transcript": None,
+            "job_id": job["id"] if job else None,
+        }, status_code=503)
     except Exception as e:
         error_detail = traceback.format_exc()
         print(f"ERROR EN TRANSCRIPCIÓN: {error_detail}")
@@ -106,8 +306,101 @@ def upload_audio(file: UploadFile = File(...)):
             "message": f"Archivo subido pero error en transcripción: {str(e)}",
             "error_detail": error_detail
         }, status_code=500)
+    if mode == "draft":
+        return JSONResponse(content={
+            "filename": file.filename,
+            "message": f"Archivo subido; borrador listo, refinando con '{REFINE_MODEL}'",
+            "transcript": transcript_text,
+            "refine_job_id": result.get("refine_job"),
+        })
     return JSONResponse(content={"filename": file.filename, "message": "Archivo subido y transcrito correctamente", "transcript": transcript_text})
 
+def _is_zip(file: UploadFile) -> bool:
+    return (Path(file.filename or "").suffix.lower() == ".zip"
+            or (file.content_type or "") in ("application/zip", "application/x-zip-compressed"))
+
+def _iter_batch_items(files: List[UploadFile]):
+    """
+    Recorre los audios del lote: (nombre, stream, tamaño esperado, error).
+    Los .zip se leen miembro a miembro desde el archivo temporal de la subida,
+    sin extraerlos ni cargarlos en memoria.
+    """
+    for file in files:
+        if not _is_zip(file):
+            error = None
+            if not (file.content_type or "").startswith("audio/"):
+                error = f"Tipo MIME no soportado: {file.content_type}. Debe ser audio/*."
+            yield file.filename, file.file, getattr(file, "size", None), error
+            continue
+        try:
+            archive = zipfile.ZipFile(file.file)
+        except zipfile.BadZipFile:
+            yield file.filename, None, None, "Archivo .zip inválido"
+            continue
+        with archive:
+            for member in archive.infolist():
+                # Solo el nombre base: nunca rutas del zip (evita escribir fuera de AUDIO_DIR)
+                name = Path(member.filename.replace("\\", "/")).name
+                if member.is_dir() or not name or name.startswith(".") or "__MACOSX" in member.filename:
+                    continue
+                with archive.open(member) as stream:
+                    yield name, stream, member.file_size, None
+
+@audio_router.post("/upload/batch")
+async def upload_audio_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(..., description="Audios y/o archivos .zip con audios"),
+    vad: bool = Query(None, description="Omitir silencios antes de transcribir"),
+):
+    """
+    Sube muchos audios en un solo request (varios archivos o un .zip) y encola su
+    transcripción. Responde de inmediato con el trabajo de cada archivo; el avance se
+    consulta en /jobs/{job_id}. Un audio idéntico a otro ya transcrito reutiliza su
+    transcripción y no se encola.
+    """
+    return await executors.run_heavy(_upload_audio_batch, background_tasks, files, vad)
+
+def _upload_audio_batch(background_tasks: BackgroundTasks, files: List[UploadFile], vad: Optional[bool]):
+    from app import jobs
+    options = {"vad": vad} if vad is not None else {}
+    items = []
+    seen = set()
+    for name, stream, size, error in _iter_batch_items(files):
+        if len(items) >= MAX_BATCH_ITEMS:
+            items.append({"filename": name, "status": "rejected",
+                          "error": f"El lote supera el máximo de {MAX_BATCH_ITEMS} archivos"})
+            break
+        if error is None and Path(name).suffix.lower() not in ALLOWED_EXT:
+            error = f"Extensión no soportada. Permitidas: {', '.join(sorted(ALLOWED_EXT))}"
+        if error is None and name in seen:
+            error = "Nombre repetido en el lote"
+        duplicate_of = None
+        if error is None:
+            try:
+                duplicate_of = store_audio(stream, name, size)
+            except storage.StorageFullError as e:
+                error = str(e)
+            except OSError as e:
+                error = f"No se pudo guardar el audio: {e}"
+        if error is not None:
+            items.append({"filename": name, "status": "rejected", "error": error})
+            continue
+        seen.add(name)
+        if duplicate_of and reuse_duplicate(duplicate_of, name):
+            schedule_post_upload(background_tasks, name)
+            items.append({"filename": name, "status": "duplicate", "duplicate_of": duplicate_of})
+            continue
+        schedule_post_upload(background_tasks, name)
+        job = jobs.enqueue(name, options=options)
+        items.append({"filename": name, "status": "queued", "job_id": job["id"]})
+    queued = sum(1 for item in items if item["status"] == "queued")
+    duplicates = sum(1 for item in items if item["status"] == "duplicate")
+    rejected = len(items) - queued - duplicates
+    return JSONResponse(
+        status_code=202 if queued or duplicates else 400,
+        content={"queued": queued, "duplicates": duplicates, "rejected": rejected, "items": items},
+    )
+
 @audio_router.delete("/{filename}")
 def delete_audio(filename: str):
     allowed_ext = ['.mp3', '.wav', '.m4a', '.webm', '.ogg', '.aac', '.flac', '.amr']
@@ -121,16 +414,20 @@ def delete_audio(filename: str):
             candidates.append(AUDIO_DIR / f"{base}{e}")
     found = None
     for c in candidates:
-        if c.exists():
+        if c.exists() or ingest.audio_exists(c.name):
             found = c
             break
-    transcript_path = BASE_DIR / "transcripts" / f"{base}{ext}.txt"
     deleted = False
     if found:
-        found.unlink()
+        storage.evict_audio(found.name)
         deleted = True
-    if transcript_path.exists():
-        transcript_path.unlink()
+        base = found.stem
+    # La transcripción y sus segmentos se nombran por el stem del audio
+    transcripts_dir = BASE_DIR / "transcripts"
+    for path in (transcripts_dir / f"{base}.txt", segments_path(transcripts_dir, base)):
+        if path.exists():
+            path.unlink()
+        storage.forget_file(path)
     if deleted:
         return {"message": f"Audio y transcripción '{found.name}' eliminados"}
     else:
@@ -140,4 +437,7 @@ def delete_audio(filename: str):
 # Registrar routers al final del archivo
 app.include_router(audio_router)
 app.include_router(transcribe_router)
-app.include_router(license_router)
\ No newline at end of file
+app.include_router(license_router)
+app.include_router(jobs_router)
+app.include_router(streaming_router)
+app.include_router(admin_router)
\ No newline at end of file
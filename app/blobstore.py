@@ -0,0 +1,178 @@
+"""
+blobstore.py
+Almacenamiento de audios direccionado por contenido.
+Cada contenido único se guarda una sola vez en audio/.blobs/<sha256>; los nombres en
+audio/ son hardlinks a ese blob (copia si el sistema de archivos no soporta hardlinks).
+index.json lleva la referencia nombre -> hash: el blob se elimina al liberar su
+última referencia. El resto de la app sigue leyendo audio/<nombre> sin cambios.
+También guarda la fecha de subida de cada referencia: el mtime de un hardlink es el del
+inodo compartido (el de la primera subida) y no sirve para la retención.
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Detectar directorio base
+if getattr(sys, 'frozen', False):
+    BASE_DIR = Path(sys.executable).parent
+else:
+    BASE_DIR = Path(__file__).parent.parent
+
+AUDIO_DIR = BASE_DIR / "audio"
+BLOBS_DIR = AUDIO_DIR / ".blobs"
+INDEX_PATH = BLOBS_DIR / "index.json"
+
+# Referencias: nombre del audio -> hash del contenido
+_refs: Optional[Dict[str, str]] = None
+# Fecha de subida de cada referencia: nombre -> timestamp
+_added: Optional[Dict[str, float]] = None
+_lock = threading.RLock()
+
+
+class HashingReader:
+    """Envuelve un stream y calcula el SHA-256 mientras se copia (sin una segunda lectura)."""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._hash.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def blob_path(digest: str) -> Path:
+    return BLOBS_DIR / digest
+
+
+def _load() -> Dict[str, str]:
+    global _refs, _added
+    if _refs is None:
+        try:
+            with open(INDEX_PATH, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            data = {}
+        if "refs" in data and isinstance(data["refs"], dict):
+            _refs, _added = data["refs"], data.get("added_at", {})
+        else:
+            # Formato anterior (solo nombre -> hash): sin fecha, se usa la del archivo
+            _refs, _added = data, {}
+    return _refs
+
+
+def _save():
+    BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = INDEX_PATH.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"refs": _refs, "added_at": _added}, f, ensure_ascii=False)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def link_or_copy(source: Path, target: Path):
+    """Crea target como hardlink de source (copia si no se puede) y reemplaza el anterior."""
+    tmp_path = target.with_name(f".{target.name}.link")
+    tmp_path.unlink(missing_ok=True)
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copy2(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+def digest_of(name: str) -> Optional[str]:
+    with _lock:
+        return _load().get(name)
+
+
+def names_for(digest: str) -> List[str]:
+    with _lock:
+        return [name for name, d in _load().items() if d == digest]
+
+
+def added_times() -> Dict[str, float]:
+    """Fecha de subida de cada audio referenciado (para la retención, ver storage.py)."""
+    with _lock:
+        _load()
+        return dict(_added)
+
+
+def commit(partial: Path, name: str, digest: str) -> Optional[str]:
+    """
+    Guarda una subida ya escrita en `partial` como audio/<name>.
+    Si el contenido ya existía se descarta la copia nueva y se enlaza el blob existente.
+    Retorna el nombre de otro audio con el mismo contenido (si lo hay).
+    """
+    from app import storage
+
+    with _lock:
+        refs = _load()
+        duplicate_of = next(
+            (other for other, d in refs.items() if d == digest and other != name and (AUDIO_DIR / other).exists()),
+            None,
+        )
+        blob = blob_path(digest)
+        BLOBS_DIR.mkdir(parents=True, exist_ok=True)
+        if blob.exists():
+            partial.unlink(missing_ok=True)
+        else:
+            partial.replace(blob)
+            storage.record_file(blob)
+        previous = refs.get(name)
+        link_or_copy(blob, AUDIO_DIR / name)
+        refs[name] = digest
+        _added[name] = time.time()
+        _save()
+        if previous and previous != digest:
+            _release_digest(previous)
+    return duplicate_of
+
+
+def _release_digest(digest: str) -> int:
+    """Elimina el blob si ya no tiene referencias. Retorna los bytes liberados."""
+    from app import storage
+
+    if digest in _load().values():
+        return 0
+    blob = blob_path(digest)
+    freed = 0
+    if blob.exists():
+        freed = blob.stat().st_size
+        blob.unlink()
+    storage.forget_file(blob)
+    return freed
+
+
+def release(name: str) -> int:
+    """
+    Quita la referencia de un audio (el archivo audio/<name> lo borra quien llama).
+    Retorna los bytes liberados: el tamaño del blob si era su última referencia.
+    """
+    with _lock:
+        refs = _load()
+        digest = refs.pop(name, None)
+        _added.pop(name, None)
+        if digest is None:
+            return 0
+        _save()
+        return _release_digest(digest)
+
+
+def get_stats() -> Dict:
+    with _lock:
+        refs = dict(_load())
+    unique = set(refs.values())
+    blob_bytes = sum(blob_path(d).stat().st_size for d in unique if blob_path(d).exists())
+    return {"references": len(refs), "unique_blobs": len(unique), "blob_bytes": blob_bytes}
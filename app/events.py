@@ -0,0 +1,75 @@
+"""
+events.py
+Difusión de eventos al frontend con Server-Sent Events (SSE).
+Cada cliente conectado recibe su propia cola; publish() puede llamarse desde
+el event loop o desde cualquier hilo (por ejemplo, desde una transcripción).
+"""
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Optional, Set
+
+KEEPALIVE_SECONDS = 15  # Comentario periódico para que proxies/navegador no corten la conexión
+MAX_QUEUED_EVENTS = 100  # Un cliente que no lee pierde los eventos más antiguos
+
+
+def format_sse(event: str, data: Dict) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+class EventBroadcaster:
+    """Publica eventos a todos los clientes SSE suscritos."""
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def subscribe(self) -> asyncio.Queue:
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=MAX_QUEUED_EVENTS)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _deliver(self, message: str):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def publish(self, event: str, data: Dict):
+        """Envía un evento a todos los suscriptores (seguro desde cualquier hilo)."""
+        if self._loop is None or not self._subscribers:
+            return
+        message = format_sse(event, data)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._deliver(message)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, message)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    async def stream(self, initial: Optional[tuple] = None) -> AsyncIterator[str]:
+        """
+        Generador para StreamingResponse. initial=(evento, datos) se envía al conectar,
+        así el cliente no necesita una consulta previa.
+        """
+        queue = self.subscribe()
+        try:
+            if initial is not None:
+                yield format_sse(*initial)
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(queue)
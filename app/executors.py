@@ -0,0 +1,76 @@
+"""
+executors.py
+Pools de hilos dedicados por tipo de trabajo.
+Las rutas `def` comparten el threadpool por defecto de Starlette (~40 hilos): unas
+cuantas subidas o transcripciones largas lo acaparan y las lecturas baratas (listados,
+licencia, transcripciones) quedan esperando detrás. Aquí cada tipo de trabajo tiene
+su propio pool con tamaño propio, y las rutas livianas son `async def`.
+- heavy: subidas con transcripción, transcripciones bajo demanda, ventanas, formas de onda
+  y la transcodificación canónica posterior a cada subida
+- io: sondeos con ffprobe, lectura y exportación de transcripciones
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+# Configuración
+HEAVY_WORKERS = int(os.getenv("HEAVY_EXECUTOR_WORKERS", "0"))  # 0 = 2 x capacidad de inferencia (mín. 4)
+IO_WORKERS = int(os.getenv("IO_EXECUTOR_WORKERS", "0"))  # 0 = min(32, núcleos + 4)
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def _size(kind: str) -> int:
+    if kind == "heavy":
+        if HEAVY_WORKERS:
+            return HEAVY_WORKERS
+        from app.model_pool import capacity
+        # Las inferencias en curso más las que esperan cupo (hasta MODEL_POOL_WAIT_SECONDS)
+        return max(4, capacity() * 2)
+    return IO_WORKERS or min(32, (os.cpu_count() or 1) + 4)
+
+
+def get_executor(kind: str) -> ThreadPoolExecutor:
+    with _lock:
+        if kind not in _executors:
+            _executors[kind] = ThreadPoolExecutor(max_workers=_size(kind), thread_name_prefix=f"{kind}-executor")
+        return _executors[kind]
+
+
+async def run_in(kind: str, fn, *args, **kwargs):
+    """Ejecuta fn en el pool `kind` sin bloquear el event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(kind), functools.partial(fn, *args, **kwargs))
+
+
+async def run_heavy(fn, *args, **kwargs):
+    return await run_in("heavy", fn, *args, **kwargs)
+
+
+async def run_io(fn, *args, **kwargs):
+    return await run_in("io", fn, *args, **kwargs)
+
+
+def status() -> Dict:
+    with _lock:
+        executors = dict(_executors)
+    return {
+        kind: {
+            "workers": executor._max_workers,
+            "threads": len(executor._threads),
+            "queued": executor._work_queue.qsize(),
+        }
+        for kind, executor in executors.items()
+    }
+
+
+def shutdown():
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,333 @@
+"""
+governor.py
+Gobernador de memoria para equipos con poca RAM (p. ej. laptops de 8 GB).
+- Mide la memoria residente del proceso (y de los workers de inferencia) y la huella de cada modelo
+- Descarga los modelos que no se usan hace más de MODEL_IDLE_UNLOAD_SECONDS
+- Antes de cada transcripción proyecta la memoria necesaria (modelo + PCM decodificado
+  según la duración) y la demora o rechaza si superaría el presupuesto
+- Registra sus decisiones para consultarlas en GET /admin/governor
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+MB = 1024 * 1024
+
+# Configuración
+MEMORY_BUDGET_MB = int(os.getenv("MEMORY_BUDGET_MB", "0"))  # 0 = MEMORY_BUDGET_RATIO de la RAM total
+MEMORY_BUDGET_RATIO = float(os.getenv("MEMORY_BUDGET_RATIO", "0.7"))
+IDLE_UNLOAD_SECONDS = int(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "600"))  # 0 = nunca descargar
+ADMISSION_WAIT_SECONDS = float(os.getenv("GOVERNOR_WAIT_SECONDS", "60"))  # Demora máxima antes de rechazar
+INTERVAL_SECONDS = 30
+
+SAMPLE_RATE = 16000
+# PCM float32 más el buffer s16 de ffmpeg y el espectrograma mel durante la inferencia
+PCM_BYTES_PER_SECOND = SAMPLE_RATE * 4 * 2
+# Huella aproximada de cada modelo en fp32 (parámetros x 4 bytes + activaciones), si no se midió
+MODEL_FOOTPRINT_MB = {
+    "tiny": 200, "base": 350, "small": 1100, "medium": 3200,
+    "large": 6400, "large-v1": 6400, "large-v2": 6400, "large-v3": 6400, "turbo": 3400,
+}
+DEFAULT_FOOTPRINT_MB = 1100
+
+
+class MemoryBudgetExceeded(Exception):
+    """La transcripción no cabe en el presupuesto de memoria."""
+
+    def __init__(self, message: str, permanent: bool = False):
+        super().__init__(message)
+        self.permanent = permanent  # True: no cabría ni con el proceso vacío
+
+
+def total_memory() -> Optional[int]:
+    """RAM física total en bytes (psutil, /proc/meminfo o la API de Windows)."""
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if sys.platform == "win32":
+        import ctypes
+
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+            ]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            return status.ullTotalPhys
+    return None
+
+
+def memory_budget() -> Optional[int]:
+    if MEMORY_BUDGET_MB:
+        return MEMORY_BUDGET_MB * MB
+    total = total_memory()
+    return int(total * MEMORY_BUDGET_RATIO) if total else None
+
+
+def model_footprint(name: str) -> int:
+    """Huella de un modelo: la medida al cargarlo si existe, si no la de la tabla."""
+    from app import model_pool
+    estimate = MODEL_FOOTPRINT_MB.get(name, DEFAULT_FOOTPRINT_MB) * MB
+    with model_pool._pools_lock:
+        pool = model_pool._pools.get(name)
+    if pool is not None and pool.footprint_bytes:
+        return max(pool.footprint_bytes, estimate)
+    return estimate
+
+
+def _model_loaded(name: str) -> bool:
+    from app import model_pool, workers
+    if workers.is_enabled():
+        # Los workers cargan el modelo por defecto al iniciar; otros modelos no se conocen desde aquí
+        return workers._pool is not None and name == model_pool.get_default_model()
+    with model_pool._pools_lock:
+        pool = model_pool._pools.get(name)
+    return pool is not None and pool.loaded() > 0
+
+
+def _loaded_models_estimate() -> int:
+    from app import model_pool
+    with model_pool._pools_lock:
+        pools = list(model_pool._pools.values())
+    return sum(model_footprint(pool.name) * pool.loaded() for pool in pools)
+
+
+def current_usage() -> int:
+    """Memoria en uso: RSS de este proceso más el de los workers de inferencia."""
+    from app import model_pool, workers
+    rss = model_pool.process_rss()
+    if rss is None:
+        # Sin forma de medir (Windows sin psutil): estimar por los modelos cargados
+        rss = _loaded_models_estimate()
+    if workers.is_enabled() and workers._pool is not None:
+        rss += workers._pool.rss_bytes()
+    return rss
+
+
+# --- Estado y decisiones ---
+_reservations: Dict[int, Dict] = {}
+_reserved_audio_bytes = 0  # PCM proyectado de las transcripciones admitidas
+_generation = 0  # Cambia con cada admisión o liberación
+_next_id = 0
+_cond = threading.Condition()
+_decisions = deque(maxlen=100)
+_counters = {"admitted": 0, "delayed": 0, "rejected": 0, "unloaded": 0}
+
+
+def _record(action: str, **detail):
+    _decisions.append({"at": time.strftime("%Y-%m-%d %H:%M:%S"), "action": action, **detail})
+    if action in ("delayed", "rejected", "unloaded"):
+        print(f"🧠 Gobernador de memoria: {action} {detail}")
+
+
+_baseline = None
+
+
+def _base_usage() -> int:
+    """Memoria del proceso sin modelos ni transcripciones (medida al iniciar el gobernador)."""
+    return _baseline or 0
+
+
+def projected_bytes(duration: Optional[float], model_name: str) -> int:
+    """Memoria adicional que necesitaría una transcripción de `duration` segundos."""
+    need = int((duration or 0) * PCM_BYTES_PER_SECOND)
+    if not _model_loaded(model_name):
+        need += model_footprint(model_name)
+    return need
+
+
+def _committed_bytes(usage: int, reserved_audio: int, reserved_models: set) -> int:
+    """
+    Memoria comprometida por lo ya admitido. El PCM de las transcripciones en curso puede
+    estar ya en el RSS medido o aún no: se toma el mayor entre lo medido y lo proyectado
+    (base + modelos cargados + PCM reservado), sin sumarlo dos veces. Los modelos que las
+    reservas van a cargar y todavía no están en memoria se suman una vez por modelo.
+    """
+    projected = _base_usage() + _loaded_models_estimate() + reserved_audio
+    pending = sum(model_footprint(name) for name in reserved_models if not _model_loaded(name))
+    return max(usage, projected) + pending
+
+
+def audio_duration(path: Path) -> Optional[float]:
+    """Duración para proyectar memoria; si ffprobe falla, estimación pesimista por tamaño (16 kbit/s)."""
+    from app.ingest import probe_duration
+    duration = probe_duration(path)
+    if duration is None and path.exists():
+        duration = path.stat().st_size / 2000
+    return duration
+
+
+@contextmanager
+def reserve(label: str, duration: Optional[float], model_name: str, wait: float = None):
+    """
+    Reserva memoria para una transcripción mientras dura. Si no cabe en el presupuesto,
+    primero descarga modelos ociosos, luego espera hasta `wait` segundos a que se libere
+    memoria y finalmente lanza MemoryBudgetExceeded.
+    La medición de RSS y las descargas se hacen fuera del lock; la admisión solo se
+    confirma si ninguna otra reserva entró o salió mientras tanto.
+    """
+    global _reserved_audio_bytes, _generation, _next_id
+    budget = memory_budget()
+    audio_bytes = int((duration or 0) * PCM_BYTES_PER_SECOND)
+    wait = ADMISSION_WAIT_SECONDS if wait is None else wait
+    info = {"label": label, "model": model_name, "duration": duration,
+            "projected_bytes": projected_bytes(duration, model_name)}
+    if budget is None:
+        yield
+        return
+
+    deadline = time.monotonic() + wait
+    delayed = False
+    while True:
+        with _cond:
+            generation = _generation
+            reserved_audio = _reserved_audio_bytes
+            reserved_models = {r["model"] for r in _reservations.values()}
+        usage = current_usage()
+        committed = _committed_bytes(usage, reserved_audio, reserved_models)
+        need = audio_bytes
+        if model_name not in reserved_models and not _model_loaded(model_name):
+            need += model_footprint(model_name)
+        if committed + need <= budget:
+            with _cond:
+                if _generation == generation:
+                    _next_id += 1
+                    _generation += 1
+                    reservation_id = _next_id
+                    _reservations[reservation_id] = {**info, "since": time.time()}
+                    _reserved_audio_bytes += audio_bytes
+                    break
+            continue  # Otra reserva cambió el estado mientras se medía: volver a medir
+        if audio_bytes + model_footprint(model_name) > budget - _base_usage():
+            _counters["rejected"] += 1
+            _record("rejected", reason="no cabe en el presupuesto", budget_bytes=budget, usage_bytes=usage, **info)
+            raise MemoryBudgetExceeded(
+                f"El audio necesita ~{info['projected_bytes'] // MB} MB y el presupuesto es de {budget // MB} MB",
+                permanent=True)
+        # Liberar modelos ociosos distintos del que se va a usar antes de hacer esperar
+        if unload_idle_models(0, keep=model_name):
+            continue
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            _counters["rejected"] += 1
+            _record("rejected", reason="memoria ocupada", budget_bytes=budget, usage_bytes=usage,
+                    committed_bytes=committed, **info)
+            raise MemoryBudgetExceeded("Memoria insuficiente en este momento; intenta de nuevo en unos minutos")
+        if not delayed:
+            delayed = True
+            _counters["delayed"] += 1
+            _record("delayed", budget_bytes=budget, usage_bytes=usage, committed_bytes=committed, **info)
+        with _cond:
+            if _generation == generation:
+                _cond.wait(min(remaining, 5.0))
+    _counters["admitted"] += 1
+    _record("admitted", **info)
+    try:
+        yield
+    finally:
+        with _cond:
+            _reservations.pop(reservation_id, None)
+            _reserved_audio_bytes -= audio_bytes
+            _generation += 1
+            _cond.notify_all()
+
+
+def unload_idle_models(idle_seconds: float = None, keep: str = None) -> int:
+    """Descarga los modelos sin uso hace más de idle_seconds. Retorna cuántos liberó."""
+    from app import model_pool, workers
+    idle_seconds = IDLE_UNLOAD_SECONDS if idle_seconds is None else idle_seconds
+    unloaded = 0
+    # Al admitir (keep) no se detienen los workers: tienen cargado el modelo que se va a usar
+    if workers.is_enabled() and keep is None:
+        freed = workers.release_idle_pool(idle_seconds)
+        if freed:
+            unloaded += 1
+            _counters["unloaded"] += 1
+            _record("unloaded", model="workers", freed_bytes=freed)
+    with model_pool._pools_lock:
+        pools = list(model_pool._pools.values())
+    for pool in pools:
+        if pool.name == keep:
+            continue
+        released = pool.unload_if_idle(idle_seconds)
+        if released:
+            unloaded += 1
+            _counters["unloaded"] += 1
+            _record("unloaded", model=pool.name, replicas=released, idle_seconds=round(pool.idle_seconds()))
+    if unloaded:
+        model_pool.release_memory()
+    return unloaded
+
+
+def get_status() -> Dict:
+    from app import model_pool
+    budget = memory_budget()
+    usage = current_usage()
+    with _cond:
+        reservations = [dict(r) for r in _reservations.values()]
+        reserved_audio = _reserved_audio_bytes
+    committed = _committed_bytes(usage, reserved_audio, {r["model"] for r in reservations})
+    return {
+        "budget_bytes": budget,
+        "total_memory_bytes": total_memory(),
+        "usage_bytes": usage,
+        "reserved_audio_bytes": reserved_audio,
+        "committed_bytes": committed,
+        "available_bytes": budget - committed if budget else None,
+        "idle_unload_seconds": IDLE_UNLOAD_SECONDS or None,
+        "admission_wait_seconds": ADMISSION_WAIT_SECONDS,
+        "models": [
+            {**pool, "footprint_bytes": model_footprint(pool["model"])}
+            for pool in model_pool.status()["pools"]
+        ],
+        "in_flight": reservations,
+        "counters": dict(_counters),
+        "decisions": list(_decisions)[-30:],
+    }
+
+
+async def governor_background():
+    """Tarea en background: descarga de modelos ociosos cada INTERVAL_SECONDS."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(INTERVAL_SECONDS)
+        try:
+            if IDLE_UNLOAD_SECONDS:
+                await loop.run_in_executor(None, unload_idle_models)
+        except Exception as e:
+            print(f"❌ Error en el gobernador de memoria: {e}")
+
+
+def start_governor():
+    """
+    Inicia el gobernador en background.
+    Debe llamarse al iniciar la app FastAPI.
+    """
+    global _baseline
+    from app import model_pool
+    _baseline = model_pool.process_rss()
+    budget = memory_budget()
+    if budget:
+        print(f"🧠 Presupuesto de memoria: {budget // MB} MB")
+    asyncio.create_task(governor_background())
@@ -0,0 +1,116 @@
+"""
+inference.py
+Backends de inferencia detrás de transcribe.inference().
+- whisper (por defecto): modelos reales de Whisper; whisper y torch se importan recién
+  al cargar el primer modelo, no al importar la app.
+- fake (INFERENCE_BACKEND=fake): segmentos sintéticos deterministas a una velocidad
+  configurable, sin torch ni pesos. Sirve para medir y probar la capa HTTP (subidas,
+  listados, exportaciones, cola) en cualquier máquina.
+Un backend carga modelos con la misma interfaz que whisper.Whisper: model.transcribe(audio, ...).
+"""
+import os
+import random
+import time
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Configuración
+BACKEND = os.getenv("INFERENCE_BACKEND", "whisper")
+FAKE_SPEED = float(os.getenv("FAKE_BACKEND_SPEED", "0"))  # Segundos de audio por segundo real; 0 = instantáneo
+FAKE_SEGMENT_SECONDS = float(os.getenv("FAKE_BACKEND_SEGMENT_SECONDS", "5"))
+
+SAMPLE_RATE = 16000
+FAKE_WORDS = (
+    "la reunión comienza con el informe del trimestre y los próximos pasos del proyecto "
+    "según lo acordado el equipo revisará los documentos antes del viernes para cerrar el tema"
+).split()
+
+
+class WhisperBackend:
+    """Modelos de Whisper (pesos mapeados en memoria si es posible, ver app/model_store.py)."""
+
+    name = "whisper"
+    _patched = False
+
+    def _whisper(self):
+        import whisper
+        import whisper.audio
+        if not WhisperBackend._patched:
+            # Que whisper use nuestro ffmpeg si alguna vez decodifica por su cuenta
+            from app.transcribe import custom_load_audio
+            whisper.audio.load_audio = custom_load_audio
+            WhisperBackend._patched = True
+        return whisper
+
+    def available_models(self) -> List[str]:
+        return self._whisper().available_models()
+
+    def load_model(self, name: str):
+        self._whisper()
+        from app.model_store import load_model
+        return load_model(name)
+
+
+class FakeModel:
+    """Imita whisper.Whisper.transcribe: un segmento cada FAKE_SEGMENT_SECONDS con texto fijo por audio."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def transcribe(self, audio: np.ndarray, verbose: Optional[bool] = None, language: str = None,
+                   word_timestamps: bool = False, **kwargs) -> Dict:
+        duration = audio.size / SAMPLE_RATE
+        if FAKE_SPEED > 0:
+            time.sleep(duration / FAKE_SPEED)
+        # Misma entrada, misma salida: la semilla depende del modelo y del contenido
+        seed = zlib.crc32(self.name.encode("utf-8") + np.ascontiguousarray(audio[:SAMPLE_RATE]).tobytes())
+        rng = random.Random(seed ^ audio.size)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + FAKE_SEGMENT_SECONDS, duration)
+            words = [rng.choice(FAKE_WORDS) for _ in range(max(1, int((end - start) * 2.5)))]
+            segment = {"id": len(segments), "start": start, "end": end, "text": " " + " ".join(words)}
+            if word_timestamps:
+                step = (end - start) / len(words)
+                segment["words"] = [
+                    {"word": " " + word, "start": start + i * step, "end": start + (i + 1) * step}
+                    for i, word in enumerate(words)
+                ]
+            segments.append(segment)
+            if verbose:
+                print(f"[{start:.3f} --> {end:.3f}]{segment['text']}")
+            start = end
+        return {
+            "text": "".join(seg["text"] for seg in segments),
+            "segments": segments,
+            "language": language or "es",
+        }
+
+
+class FakeBackend:
+    """Sin torch ni pesos: acepta los mismos nombres de modelo que Whisper."""
+
+    name = "fake"
+    MODELS = ["tiny", "base", "small", "medium", "large", "large-v1", "large-v2", "large-v3", "turbo"]
+
+    def available_models(self) -> List[str]:
+        return list(self.MODELS)
+
+    def load_model(self, name: str) -> FakeModel:
+        return FakeModel(name)
+
+
+BACKENDS = {"whisper": WhisperBackend, "fake": FakeBackend}
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if BACKEND not in BACKENDS:
+            raise ValueError(f"INFERENCE_BACKEND desconocido: {BACKEND}. Usa uno de: {', '.join(BACKENDS)}")
+        _backend = BACKENDS[BACKEND]()
+    return _backend
@@ -0,0 +1,232 @@
+"""
+ingest.py
+Transcodificación opcional al subir un audio: convierte a un formato canónico
+16 kHz mono (FLAC u Opus) que se decodifica mucho más rápido que .m4a/.webm/.amr.
+La copia canónica se usa para inferencia y para medir duración; el original se
+conserva o se elimina según KEEP_ORIGINAL_AUDIO.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Detectar directorio base
+if getattr(sys, 'frozen', False):
+    BASE_DIR = Path(sys.executable).parent
+else:
+    BASE_DIR = Path(__file__).parent.parent
+
+AUDIO_DIR = BASE_DIR / "audio"
+CANONICAL_DIR = AUDIO_DIR / ".canonical"
+# ffprobe del paquete de Windows; si no está (desarrollo, CI), el del sistema
+FFPROBE_PATH = str(BASE_DIR / "ffprobe.exe")
+if not os.path.exists(FFPROBE_PATH):
+    FFPROBE_PATH = shutil.which("ffprobe") or FFPROBE_PATH
+
+# Configuración
+CANONICAL_FORMAT = os.getenv("CANONICAL_FORMAT", "off").lower()  # flac | opus | off
+KEEP_ORIGINAL = os.getenv("KEEP_ORIGINAL_AUDIO", "1") == "1"
+
+# formato -> (extensión, argumentos de codec para ffmpeg)
+FORMATS = {
+    "flac": (".flac", ["-c:a", "flac", "-sample_fmt", "s16", "-compression_level", "5"]),
+    "opus": (".opus", ["-c:a", "libopus", "-b:a", "32k", "-application", "voip"]),
+}
+
+
+def is_enabled() -> bool:
+    return CANONICAL_FORMAT in FORMATS
+
+
+def canonical_path(filename: str) -> Optional[Path]:
+    """Ruta de la copia canónica de un audio (exista o no)."""
+    if not is_enabled():
+        return None
+    return CANONICAL_DIR / f"{filename}{FORMATS[CANONICAL_FORMAT][0]}"
+
+
+def report_path(filename: str) -> Path:
+    return CANONICAL_DIR / f"{filename}.json"
+
+
+def resolve_audio_path(filename: str) -> Path:
+    """
+    Ruta a usar para decodificar un audio: la copia canónica si existe,
+    si no el archivo original subido.
+    """
+    for ext, _ in FORMATS.values():
+        path = CANONICAL_DIR / f"{filename}{ext}"
+        if path.exists():
+            return path
+    return AUDIO_DIR / filename
+
+
+def playback_path(filename: str) -> Path:
+    """
+    Ruta a usar para reproducir un audio: el original si se conserva (calidad
+    completa), si no la copia canónica.
+    """
+    original = AUDIO_DIR / filename
+    if original.exists():
+        return original
+    return resolve_audio_path(filename)
+
+
+def audio_exists(filename: str) -> bool:
+    return resolve_audio_path(filename).exists()
+
+
+def list_canonical_only() -> List[Path]:
+    """Copias canónicas cuyo original ya fue eliminado por la política de retención."""
+    if not CANONICAL_DIR.exists():
+        return []
+    exts = tuple(ext for ext, _ in FORMATS.values())
+    return [
+        f for f in CANONICAL_DIR.iterdir()
+        if f.is_file() and f.name.endswith(exts) and not (AUDIO_DIR / original_name(f)).exists()
+    ]
+
+
+def original_name(canonical: Path) -> str:
+    """Nombre original ("reunion.m4a") a partir de la copia canónica ("reunion.m4a.flac")."""
+    return canonical.name[:-len(canonical.suffix)]
+
+
+def remove_canonical(filename: str):
+    """Elimina la copia canónica y su reporte (al borrar o reemplazar un audio)."""
+    for ext, _ in FORMATS.values():
+        path = CANONICAL_DIR / f"{filename}{ext}"
+        if path.exists():
+            path.unlink()
+    if report_path(filename).exists():
+        report_path(filename).unlink()
+
+
+def probe_duration(path: Path) -> Optional[float]:
+    """Duración en segundos leída del contenedor con ffprobe (None si no se puede leer)."""
+    cmd = [
+        FFPROBE_PATH,
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        str(path)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        output = result.stdout.strip()
+        return float(output) if output else None
+    except (OSError, ValueError):
+        return None
+
+
+# Duraciones ya sondeadas: ruta -> (mtime_ns, tamaño, duración). Listar audios no
+# vuelve a lanzar ffprobe por archivos que no cambiaron
+_duration_cache: Dict[str, tuple] = {}
+_duration_lock = threading.Lock()
+DURATION_CACHE_MAX = 4096
+
+
+def cached_duration(path: Path) -> Optional[float]:
+    """Como probe_duration, pero reutiliza el resultado mientras el archivo no cambie."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    key = str(path)
+    with _duration_lock:
+        entry = _duration_cache.get(key)
+    if entry and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+        return entry[2]
+    duration = probe_duration(path)
+    if duration is not None:
+        with _duration_lock:
+            if len(_duration_cache) >= DURATION_CACHE_MAX:
+                _duration_cache.clear()
+            _duration_cache[key] = (st.st_mtime_ns, st.st_size, duration)
+    return duration
+
+
+def _time_decode(path: Path) -> float:
+    from app.transcribe import custom_load_audio
+    t0 = time.perf_counter()
+    custom_load_audio(str(path))
+    return time.perf_counter() - t0
+
+
+def transcode_to_canonical(filename: str) -> Optional[Dict]:
+    """
+    Convierte un audio subido al formato canónico y guarda un reporte con el
+    espacio ahorrado y la reducción del tiempo de decodificación.
+    Pensado para ejecutarse en background después de la subida.
+    """
+    if not is_enabled():
+        return None
+    source = AUDIO_DIR / filename
+    if not source.exists():
+        return None
+    from app.transcribe import FFMPEG_PATH
+    CANONICAL_DIR.mkdir(exist_ok=True)
+    target = canonical_path(filename)
+    tmp_target = target.with_name(target.name + ".tmp")
+    cmd = [
+        FFMPEG_PATH,
+        "-nostdin",
+        "-y",
+        "-i", str(source),
+        "-vn",
+        "-ac", "1",
+        "-ar", "16000",
+        *FORMATS[CANONICAL_FORMAT][1],
+        "-f", "ogg" if CANONICAL_FORMAT == "opus" else "flac",
+        str(tmp_target),
+    ]
+    try:
+        subprocess.run(cmd, capture_output=True, check=True)
+        tmp_target.replace(target)
+    except Exception as e:
+        if tmp_target.exists():
+            tmp_target.unlink()
+        print(f"❌ Error transcodificando {filename}: {e}")
+        return None
+
+    report = {
+        "filename": filename,
+        "format": CANONICAL_FORMAT,
+        "original_bytes": source.stat().st_size,
+        "canonical_bytes": target.stat().st_size,
+    }
+    report["saved_bytes"] = report["original_bytes"] - report["canonical_bytes"]
+    try:
+        decode_original = _time_decode(source)
+        decode_canonical = _time_decode(target)
+        report["decode_seconds_original"] = round(decode_original, 3)
+        report["decode_seconds_canonical"] = round(decode_canonical, 3)
+        report["decode_speedup"] = round(decode_original / decode_canonical, 2) if decode_canonical else None
+    except Exception as e:
+        print(f"⚠️ No se pudo medir la decodificación de {filename}: {e}")
+
+    report["original_kept"] = KEEP_ORIGINAL
+    if not KEEP_ORIGINAL:
+        # audio/<nombre> es un hardlink al blob: borrar solo el nombre no libera espacio,
+        # hay que soltar también su referencia (el blob se borra si era la última)
+        from app import blobstore, storage
+        source.unlink()
+        storage.forget_file(source)
+        blobstore.release(filename)
+    with open(report_path(filename), "w", encoding="utf-8") as f:
+        json.dump(report, f)
+    print(f"✅ {filename} → {target.name} ({report['saved_bytes']} bytes ahorrados)")
+    return report
+
+
+def get_report(filename: str) -> Optional[Dict]:
+    path = report_path(filename)
+    if not path.exists():
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
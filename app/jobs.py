@@ -0,0 +1,544 @@
+"""
+jobs.py
+Cola de trabajos persistente en SQLite.
+- Cada transcripción queda registrada con estado, intentos, fechas, modelo y opciones
+- Los trabajos interrumpidos (caída o reinicio del backend) se re-encolan al vencer su lease
+- Los fallos se reintentan con backoff exponencial hasta MAX_ATTEMPTS
+- SQLite en modo WAL + BEGIN IMMEDIATE: seguro con varios procesos accediendo a la vez
+- Varios procesos de la misma máquina pueden tomar trabajos de la misma base: cada trabajo en curso
+  tiene un lease que su dueño renueva (heartbeat); si el dueño muere, el lease vence
+  y otro nodo lo reclama
+"""
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Detectar directorio base
+if getattr(sys, 'frozen', False):
+    BASE_DIR = Path(sys.executable).parent
+else:
+    BASE_DIR = Path(__file__).parent.parent
+
+# Configuración
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB", str(BASE_DIR / "data" / "jobs.db")))
+MAX_ATTEMPTS = int(os.getenv("JOBS_MAX_ATTEMPTS", "3"))
+BACKOFF_BASE_SECONDS = 30      # 30s, 60s, 120s, ...
+BACKOFF_MAX_SECONDS = 3600
+POLL_INTERVAL_SECONDS = 2
+JOB_CONCURRENCY = int(os.getenv("JOBS_CONCURRENCY", "0")) or max(1, int(os.getenv("INFERENCE_WORKERS", "0")))
+DISPATCHER_ENABLED = os.getenv("JOBS_DISPATCHER", "1") == "1"  # 0 = nodo solo API
+LEASE_SECONDS = int(os.getenv("JOBS_LEASE_SECONDS", "60"))
+HEARTBEAT_SECONDS = max(1, LEASE_SECONDS // 4)
+
+# Identidad de este proceso dentro del conjunto de nodos
+NODE_ID = os.getenv("NODE_ID") or socket.gethostname()
+WORKER_ID = f"{NODE_ID}:{os.getpid()}"
+
+
+class JobState:
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    kind TEXT NOT NULL DEFAULT 'transcribe',
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    model TEXT,
+    options TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    next_run_at REAL NOT NULL,
+    lease_owner TEXT,
+    lease_expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (state, next_run_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (state, lease_expires_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_filename ON jobs (filename);
+CREATE TABLE IF NOT EXISTS nodes (
+    worker_id TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+# Columnas agregadas después de la primera versión de la tabla
+MIGRATIONS = {
+    "lease_owner": "ALTER TABLE jobs ADD COLUMN lease_owner TEXT",
+    "lease_expires_at": "ALTER TABLE jobs ADD COLUMN lease_expires_at REAL",
+}
+
+# Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def _connect() -> sqlite3.Connection:
+    global _schema_ready
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    # isolation_level=None: transacciones explícitas (BEGIN IMMEDIATE) para reclamar trabajos
+    conn = sqlite3.connect(str(JOBS_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    with _schema_lock:
+        if not _schema_ready:
+            _migrate(conn)
+            conn.executescript(SCHEMA)
+            _schema_ready = True
+    _local.conn = conn
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection):
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)").fetchall()}
+    if not columns:
+        return  # Tabla nueva: la crea SCHEMA
+    for column, statement in MIGRATIONS.items():
+        if column not in columns:
+            conn.execute(statement)
+
+
+def _row_to_job(row: sqlite3.Row) -> Optional[Dict]:
+    if row is None:
+        return None
+    job = dict(row)
+    job["options"] = json.loads(job["options"]) if job["options"] else {}
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Espera antes del siguiente intento: exponencial con tope."""
+    return min(BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), BACKOFF_MAX_SECONDS)
+
+
+def enqueue(filename: str, model: str = None, options: Dict = None, kind: str = "transcribe",
+            max_attempts: int = MAX_ATTEMPTS, state: str = JobState.QUEUED) -> Dict:
+    """Registra un trabajo nuevo. Retorna el trabajo creado."""
+    now = time.time()
+    job_id = uuid.uuid4().hex
+    running = state == JobState.RUNNING
+    conn = _connect()
+    conn.execute(
+        "INSERT INTO jobs (id, filename, kind, state, attempts, max_attempts, model, options, "
+        "created_at, updated_at, started_at, next_run_at, lease_owner, lease_expires_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (job_id, filename, kind, state, 1 if running else 0, max_attempts, model, json.dumps(options or {}),
+         now, now, now if running else None, now,
+         WORKER_ID if running else None, now + LEASE_SECONDS if running else None),
+    )
+    _notify_dispatcher()
+    return get_job(job_id)
+
+
+def claim_next(owner: str = None) -> Optional[Dict]:
+    """
+    Toma el próximo trabajo listo (o uno cuyo lease venció) y lo marca como running
+    con un lease a nombre de owner. Atómico entre procesos y nodos.
+    """
+    owner = owner or WORKER_ID
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE (state = ? AND next_run_at <= ?) "
+            "OR (state = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?) AND attempts < max_attempts) "
+            "ORDER BY next_run_at LIMIT 1",
+            (JobState.QUEUED, now, JobState.RUNNING, now),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ?, updated_at = ?, "
+            "lease_owner = ?, lease_expires_at = ? WHERE id = ?",
+            (JobState.RUNNING, now, now, owner, now + LEASE_SECONDS, row["id"]),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(row["id"])
+
+
+def renew_lease(job_id: str, owner: str = None) -> bool:
+    """Heartbeat: extiende el lease. False si el trabajo ya no pertenece a owner."""
+    now = time.time()
+    cur = _connect().execute(
+        "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+        (now + LEASE_SECONDS, now, job_id, JobState.RUNNING, owner or WORKER_ID),
+    )
+    return cur.rowcount == 1
+
+
+def complete(job_id: str, result: Dict = None, owner: str = None) -> bool:
+    """Marca el trabajo como terminado (solo si owner aún tiene el lease)."""
+    now = time.time()
+    cur = _connect().execute(
+        "UPDATE jobs SET state = ?, result = ?, error = NULL, finished_at = ?, updated_at = ?, "
+        "lease_owner = NULL, lease_expires_at = NULL WHERE id = ? AND lease_owner = ?",
+        (JobState.DONE, json.dumps(result or {}), now, now, job_id, owner or WORKER_ID),
+    )
+    return cur.rowcount == 1
+
+
+def fail(job_id: str, error: str, owner: str = None, permanent: bool = False) -> Optional[Dict]:
+    """
+    Registra un fallo: re-encola con backoff o marca failed si se agotaron los intentos.
+    permanent: el error no se resuelve reintentando (se marca failed de inmediato).
+    """
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT attempts, max_attempts FROM jobs WHERE id = ? AND lease_owner = ?",
+            (job_id, owner or WORKER_ID),
+        ).fetchone()
+        if row is None:
+            pass  # Otro nodo reclamó el trabajo: no pisar su estado
+        elif row["attempts"] < row["max_attempts"] and not permanent:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, next_run_at = ?, updated_at = ?, "
+                "lease_owner = NULL, lease_expires_at = NULL WHERE id = ?",
+                (JobState.QUEUED, error, now + backoff_seconds(row["attempts"]), now, job_id),
+            )
+        else:
+            conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, finished_at = ?, updated_at = ?, "
+                "lease_owner = NULL, lease_expires_at = NULL WHERE id = ?",
+                (JobState.FAILED, error, now, now, job_id),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(job_id)
+
+
+def reclaim_expired() -> int:
+    """
+    Re-encola los trabajos running cuyo lease venció (su nodo o proceso murió).
+    Los que ya agotaron sus intentos quedan como failed.
+    """
+    conn = _connect()
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        expired = "state = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)"
+        conn.execute(
+            f"UPDATE jobs SET state = ?, error = 'Worker sin heartbeat; intentos agotados', finished_at = ?, "
+            f"updated_at = ?, lease_owner = NULL, lease_expires_at = NULL WHERE {expired} AND attempts >= max_attempts",
+            (JobState.FAILED, now, now, JobState.RUNNING, now),
+        )
+        cur = conn.execute(
+            f"UPDATE jobs SET state = ?, next_run_at = ?, updated_at = ?, error = 'Worker sin heartbeat; re-encolado', "
+            f"lease_owner = NULL, lease_expires_at = NULL WHERE {expired}",
+            (JobState.QUEUED, now, now, JobState.RUNNING, now),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return cur.rowcount
+
+
+# --- Registro de nodos (para reportar qué procesos están vivos) ---
+def register_node(role: str):
+    now = time.time()
+    _connect().execute(
+        "INSERT OR REPLACE INTO nodes (worker_id, node_id, role, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)",
+        (WORKER_ID, NODE_ID, role, now, now),
+    )
+
+
+def node_heartbeat():
+    _connect().execute("UPDATE nodes SET heartbeat_at = ? WHERE worker_id = ?", (time.time(), WORKER_ID))
+
+
+def list_nodes() -> List[Dict]:
+    now = time.time()
+    rows = _connect().execute(
+        "SELECT n.*, (SELECT COUNT(*) FROM jobs j WHERE j.lease_owner = n.worker_id AND j.state = ?) AS running_jobs "
+        "FROM nodes n ORDER BY n.heartbeat_at DESC",
+        (JobState.RUNNING,),
+    ).fetchall()
+    nodes = []
+    for row in rows:
+        node = dict(row)
+        node["alive"] = now - node["heartbeat_at"] < LEASE_SECONDS
+        nodes.append(node)
+    return nodes
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    row = _connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+
+def list_jobs(state: str = None, filename: str = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+    query = "SELECT * FROM jobs"
+    conditions, params = [], []
+    if state:
+        conditions.append("state = ?")
+        params.append(state)
+    if filename:
+        conditions.append("filename = ?")
+        params.append(filename)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+    params += [limit, offset]
+    return [_row_to_job(row) for row in _connect().execute(query, params).fetchall()]
+
+
+def count_by_state() -> Dict[str, int]:
+    rows = _connect().execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+    counts = {state: 0 for state in (JobState.QUEUED, JobState.RUNNING, JobState.DONE, JobState.FAILED)}
+    counts.update({row["state"]: row["n"] for row in rows})
+    return counts
+
+
+# --- Ejecución ---
+def execute_job(job: Dict) -> Dict:
+    """Ejecuta un trabajo y retorna su resultado."""
+    if job["kind"] == "transcribe":
+        if job["options"].get("draft"):
+            from app.transcribe import transcribe_draft
+            transcript_file, refine_job = transcribe_draft(job["filename"], vad=job["options"].get("vad"))
+            return {"transcript": transcript_file, "refine_job": refine_job}
+        from app.transcribe import transcribe_audio
+        transcript_file = transcribe_audio(job["filename"], vad=job["options"].get("vad"), model_name=job["model"])
+        return {"transcript": transcript_file}
+    if job["kind"] == "refine":
+        from app.transcribe import refine_transcript
+        transcript_file = refine_transcript(job["filename"], model_name=job["model"], options=job["options"])
+        return {"transcript": transcript_file}
+    raise ValueError(f"Tipo de trabajo desconocido: {job['kind']}")
+
+
+class LeaseKeeper:
+    """Renueva el lease de un trabajo en un hilo mientras se ejecuta."""
+
+    def __init__(self, job_id: str, owner: str = None):
+        self.job_id = job_id
+        self.owner = owner or WORKER_ID
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(HEARTBEAT_SECONDS):
+            try:
+                if not renew_lease(self.job_id, self.owner):
+                    self.lost = True
+                    print(f"⚠️ Lease perdido para el trabajo {self.job_id}")
+                    return
+            except Exception as e:
+                print(f"❌ Error renovando lease de {self.job_id}: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(job: Dict, owner: str = None) -> Dict:
+    """Ejecuta un trabajo ya reclamado (con heartbeat) y registra el resultado o el fallo."""
+    owner = owner or job.get("lease_owner") or WORKER_ID
+    try:
+        with LeaseKeeper(job["id"], owner):
+            result = execute_job(job)
+    except Exception as e:
+        print(f"❌ Trabajo {job['id']} ({job['filename']}) falló: {e}")
+        failed = fail(job["id"], f"{e}\n{traceback.format_exc()}", owner, permanent=getattr(e, "permanent", False))
+        # Estado registrado (re-encolado o fallido) para quien llamó: ver failed_job()
+        e.job = failed or job
+        raise
+    if not complete(job["id"], result, owner):
+        print(f"⚠️ Trabajo {job['id']} terminado pero otro worker lo había reclamado")
+    return result
+
+
+def run_inline(filename: str, model: str = None, options: Dict = None) -> Dict:
+    """
+    Registra y ejecuta un trabajo en el hilo actual (subida o transcripción síncrona).
+    Si el backend se cae a mitad, el lease vence y el trabajo se re-encola.
+    """
+    job = enqueue(filename, model=model, options=options, state=JobState.RUNNING)
+    return run_job(job)
+
+
+def failed_job(error: Exception) -> Optional[Dict]:
+    """Trabajo (con su estado tras el fallo) asociado a una excepción de run_job/run_inline."""
+    return getattr(error, "job", None)
+
+
+# --- Despachador en background ---
+_wakeup: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _notify_dispatcher():
+    # Despierta al despachador sin esperar al siguiente sondeo (seguro desde cualquier hilo)
+    if _loop is not None and _wakeup is not None:
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _license_allows_jobs() -> bool:
+    """Mismo criterio que el middleware de licencia para las rutas de transcripción."""
+    from app.license_monitor import get_license_state_ref
+    state = get_license_state_ref()
+    if state["state"] is None or not state["allow_usage"]:
+        return False
+    return (state["features"] or {}).get("transcription") is not False
+
+
+def run_next_job(owner: str = None) -> bool:
+    """
+    Reserva un cupo de inferencia, reclama el próximo trabajo y lo ejecuta.
+    El cupo se toma antes de reclamar: un trabajo nunca espera réplica con el lease corriendo.
+    Retorna False si no había trabajos listos o si la licencia no permite transcribir
+    (los trabajos quedan en cola hasta que se renueve).
+    """
+    if not _license_allows_jobs():
+        return False
+    from app.model_pool import admission
+    with admission():
+        job = claim_next(owner)
+        if job is None:
+            return False
+        print(f"▶️ Trabajo {job['id']} ({job['filename']}), intento {job['attempts']}/{job['max_attempts']}")
+        try:
+            run_job(job, owner)
+        except Exception:
+            pass  # Ya registrado en run_job
+    return True
+
+
+async def _dispatcher_slot(slot: int):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            ran = await loop.run_in_executor(None, run_next_job, WORKER_ID)
+            if not ran:
+                _wakeup.clear()
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        except Exception as e:
+            print(f"❌ Error en el despachador de trabajos: {e}")
+            await asyncio.sleep(POLL_INTERVAL_SECONDS)
+
+
+async def _maintenance():
+    # Heartbeat del nodo y recuperación de trabajos de nodos caídos
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, node_heartbeat)
+            reclaimed = await loop.run_in_executor(None, reclaim_expired)
+            if reclaimed:
+                print(f"🔁 {reclaimed} trabajos de workers caídos re-encolados")
+                _notify_dispatcher()
+        except Exception as e:
+            print(f"❌ Error en mantenimiento de la cola: {e}")
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+
+
+def start_job_dispatcher():
+    """
+    Inicia el despachador en background (re-encola trabajos interrumpidos al vencer su lease).
+    Con JOBS_DISPATCHER=0 el nodo solo atiende la API y no ejecuta trabajos en cola.
+    Debe llamarse al iniciar la app FastAPI.
+    """
+    global _wakeup, _loop
+    _loop = asyncio.get_running_loop()
+    _wakeup = asyncio.Event()
+    register_node("api+worker" if DISPATCHER_ENABLED else "api")
+    asyncio.create_task(_maintenance())
+    if not DISPATCHER_ENABLED:
+        return
+    for slot in range(JOB_CONCURRENCY):
+        asyncio.create_task(_dispatcher_slot(slot))
+
+
+# --- Modo worker (sin API): python main.py --worker ---
+def _refresh_worker_license():
+    """Actualiza el estado de licencia del nodo worker (sin event loop ni monitor async)."""
+    from app.license_monitor import refresh_license_state, set_license_error
+    try:
+        refresh_license_state()
+    except Exception as e:
+        print(f"❌ Error en verificación de licencia: {e}")
+        set_license_error(e)
+
+
+def run_worker_node(concurrency: int = JOB_CONCURRENCY):
+    """
+    Bucle de un nodo worker: reclama trabajos de la base compartida y los ejecuta.
+    Varios procesos de la misma máquina pueden ejecutarlo contra la misma base: SQLite
+    necesita un sistema de archivos local (sus bloqueos no son fiables en red) y la
+    licencia está atada a la huella de este equipo.
+    Solo reclama trabajos mientras la licencia permita transcribir.
+    """
+    register_node("worker")
+    _refresh_worker_license()
+    print(f"🛠️ Nodo worker {WORKER_ID} iniciado ({concurrency} en paralelo, base: {JOBS_DB_PATH})")
+    stop = threading.Event()
+
+    def slot():
+        while not stop.is_set():
+            try:
+                if not run_next_job():
+                    stop.wait(POLL_INTERVAL_SECONDS)
+            except Exception as e:
+                print(f"❌ Error en el worker: {e}")
+                stop.wait(POLL_INTERVAL_SECONDS)
+
+    threads = [threading.Thread(target=slot, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    try:
+        while True:
+            node_heartbeat()
+            _refresh_worker_license()
+            reclaimed = reclaim_expired()
+            if reclaimed:
+                print(f"🔁 {reclaimed} trabajos de workers caídos re-encolados")
+            time.sleep(HEARTBEAT_SECONDS)
+    except KeyboardInterrupt:
+        print("⏹️ Deteniendo nodo worker...")
+        stop.set()
@@ -0,0 +1,65 @@
+"""
+jobs_router.py
+Endpoints API para encolar transcripciones y consultar el historial de trabajos.
+"""
+from fastapi import APIRouter, HTTPException, Query
+from app import jobs
+from app.inference import get_backend
+from app.ingest import audio_exists
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.post("")
+def create_job(
+    filename: str = Query(..., description="Nombre del archivo de audio"),
+    model: str = Query(None, description="Modelo de Whisper (opcional)"),
+    vad: bool = Query(None, description="Omitir silencios antes de transcribir"),
+):
+    """Encola una transcripción y retorna el trabajo sin esperar a que termine."""
+    # Validar antes de encolar: un modelo inválido solo fallaría en el worker, tras agotar los reintentos
+    if model and model not in get_backend().available_models():
+        raise HTTPException(status_code=400, detail=f"Modelo no soportado: {model}")
+    if not audio_exists(filename):
+        raise HTTPException(status_code=404, detail=f"Archivo de audio '{filename}' no encontrado")
+    options = {"vad": vad} if vad is not None else {}
+    return jobs.enqueue(filename, model=model, options=options)
+
+
+@router.get("")
+def list_jobs(
+    state: str = Query(None, description="queued, running, done o failed"),
+    filename: str = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    """Historial de trabajos, del más reciente al más antiguo."""
+    return {"jobs": jobs.list_jobs(state=state, filename=filename, limit=limit, offset=offset)}
+
+
+@router.get("/stats")
+def get_jobs_stats():
+    """Cantidad de trabajos por estado."""
+    return jobs.count_by_state()
+
+
+@router.get("/capacity")
+def get_capacity():
+    """Réplicas de modelos cargadas en este proceso, en uso y rechazos por capacidad, y pools de hilos."""
+    from app import executors
+    from app.model_pool import status
+    return {**status(), "executors": executors.status()}
+
+
+@router.get("/nodes")
+def get_nodes():
+    """Procesos (API y workers) que usan la misma base de trabajos y sus trabajos en curso."""
+    return {"nodes": jobs.list_nodes()}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
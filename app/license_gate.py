@@ -0,0 +1,58 @@
+"""
+license_gate.py
+Middleware que bloquea las rutas costosas (subida, transcripción, exportación)
+cuando la licencia no permite el uso o la feature correspondiente está deshabilitada.
+Lee el estado cacheado por el monitor de licencia: una lectura de referencia y
+un par de comparaciones por request, sin E/S ni verificación criptográfica.
+"""
+from fastapi.responses import JSONResponse
+
+from app.license_monitor import get_license_state_ref
+
+# (método, prefijo de ruta, feature de la licencia que la habilita)
+# La feature solo bloquea si la licencia la declara explícitamente en false.
+GATED_ROUTES = (
+    ("POST", "/audio/upload", "transcription"),
+    ("POST", "/transcript", "transcription"),
+    ("POST", "/jobs", "transcription"),
+    ("GET", "/transcript/export_docx", "export_docx"),
+    ("GET", "/transcript/export/", "export_subtitles"),
+)
+
+
+def _match(method: str, path: str):
+    for rule_method, prefix, feature in GATED_ROUTES:
+        if method == rule_method and path.startswith(prefix):
+            return feature
+    return None
+
+
+class LicenseGateMiddleware:
+    """Middleware ASGI puro (sin BaseHTTPMiddleware, que agrega latencia por request)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            feature = _match(scope["method"], scope["path"])
+            if feature is not None:
+                # Referencia al estado vigente; el monitor la reemplaza completa al actualizar
+                state = get_license_state_ref()
+                if state["state"] is None:
+                    # Sin estado verificado (verificación pendiente o fallida): se bloquea
+                    blocked = True
+                    detail = "Verificación de licencia pendiente o fallida"
+                else:
+                    blocked = not state["allow_usage"]
+                    if not blocked and (state["features"] or {}).get(feature) is False:
+                        blocked = True
+                    detail = state["user_message"] or "Función no habilitada por la licencia"
+                if blocked:
+                    response = JSONResponse(
+                        status_code=403,
+                        content={"detail": detail, "state": state["state"], "feature": feature},
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
@@ -1,6 +1,10 @@
 """
 license_monitor.py
-Monitoreo periódico de licencia en background.
+Monitoreo de licencia en background, dirigido por eventos.
+- Detecta cambios en license.lic (mtime/tamaño) en segundos
+- Programa la siguiente verificación para el instante exacto en que el estado puede
+  cambiar (cambio de días restantes, umbral de aviso, expiración)
+- Publica cada transición de estado a los clientes SSE (/api/license/events)
 """
 import asyncio
 import os
@@ -8,6 +12,8 @@ from pathlib import Path
 import sys
 from datetime import datetime
 
+from app.events import EventBroadcaster
+
 # Detectar directorio base
 if getattr(sys, 'frozen', False):
     BASE_DIR = Path(sys.executable).parent
@@ -17,58 +23,145 @@ else:
 LICENSE_PATH = BASE_DIR / "license.lic"
 
 # Configuración
-CHECK_INTERVAL_HOURS = 6  # Verificar cada 6 horas
-CHECK_INTERVAL_SECONDS = CHECK_INTERVAL_HOURS * 3600
+FILE_POLL_SECONDS = 2  # Frecuencia con la que se revisa si license.lic cambió (solo stat)
+
+# Campos que definen una transición de estado para el frontend
+STATE_FIELDS = ("state", "allow_usage", "show_warning", "user_message", "days_remaining", "features")
 
-# Estado global de la licencia (cache)
+# Estado global de la licencia (cache). Se reemplaza completo en cada actualización
+# (nunca se modifica en el lugar), así los lectores siempre ven un estado consistente.
 _license_state = {
     "last_check": None,
-    "state": None,
-    "allow_usage": True,
+    "state": None,  # None = aún sin verificar: las rutas protegidas se bloquean
+    "allow_usage": False,
+    "show_warning": False,
     "user_message": "",
-    "days_remaining": None
+    "days_remaining": None,
+    "features": {},
 }
 
+# Clientes SSE suscritos a cambios de licencia
+license_events = EventBroadcaster()
+
 
 def get_cached_license_state():
     """Retorna el estado cacheado de la licencia."""
     return _license_state.copy()
 
 
-async def check_license_background():
+def get_license_state_ref():
+    """Referencia al estado actual (sin copiar). No modificar: solo lectura."""
+    return _license_state
+
+
+def public_state(state: dict) -> dict:
+    """Estado serializable para enviar al frontend."""
+    data = {field: state.get(field) for field in STATE_FIELDS}
+    data["last_check"] = state["last_check"].isoformat() if state.get("last_check") else None
+    return data
+
+
+def _resolve_state() -> dict:
+    """Estado actual de la licencia (usa la cache de verificación del resolver)."""
+    if not LICENSE_PATH.exists():
+        return {
+            "state": "BLOCKED",
+            "allow_usage": False,
+            "show_warning": False,
+            "user_message": "No se encontró archivo de licencia. Contacta al proveedor para obtener tu licencia.",
+            "days_remaining": None,
+            "technical_status": "no_license_file",
+            "features": {},
+        }
+    from public.app_state_resolver import get_app_state_cached, get_features
+    state = get_app_state_cached(str(LICENSE_PATH))
+    state["features"] = get_features(state)
+    return state
+
+
+def refresh_license_state() -> bool:
     """
-    Tarea en background que verifica la licencia periódicamente.
-    Se ejecuta cada CHECK_INTERVAL_HOURS horas.
+    Recalcula el estado y lo publica si cambió.
+    Retorna True si hubo una transición.
     """
     global _license_state
-    
-    print(f"🔄 Monitor de licencia iniciado (cada {CHECK_INTERVAL_HOURS}h)")
-    
+    state = _resolve_state()
+    new_state = {field: state.get(field) for field in STATE_FIELDS}
+    new_state["technical_status"] = state.get("technical_status")  # Solo para /api/license/status
+    new_state["last_check"] = datetime.now()
+    changed = any(new_state[field] != _license_state.get(field) for field in STATE_FIELDS)
+    # Reemplazo atómico de la referencia
+    _license_state = new_state
+    if changed:
+        if not new_state["allow_usage"]:
+            print(f"⚠️ LICENCIA BLOQUEADA: {new_state['user_message']}")
+        elif new_state["show_warning"]:
+            print(f"⚠️ {new_state['user_message']}")
+        license_events.publish("license", public_state(new_state))
+    return changed
+
+
+def set_license_error(error: Exception):
+    """Publica un estado BLOCKED cuando la verificación no pudo completarse."""
+    global _license_state
+    new_state = {
+        "state": "BLOCKED",
+        "allow_usage": False,
+        "show_warning": False,
+        "user_message": "No fue posible verificar la licencia. Contacta al proveedor.",
+        "days_remaining": None,
+        "features": {},
+        "technical_status": f"error: {error}",
+        "last_check": datetime.now(),
+    }
+    changed = any(new_state[field] != _license_state.get(field) for field in STATE_FIELDS)
+    _license_state = new_state
+    if changed:
+        license_events.publish("license", public_state(new_state))
+
+
+def _license_signature():
+    try:
+        st = os.stat(LICENSE_PATH)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def _seconds_until_next_change() -> float:
+    """Segundos hasta el próximo instante en que el estado puede cambiar por tiempo."""
+    from public.app_state_resolver import cached_state_valid_until
+    valid_until = cached_state_valid_until(str(LICENSE_PATH))
+    if valid_until is None:
+        return FILE_POLL_SECONDS
+    return max((valid_until - datetime.now()).total_seconds(), 0.0)
+
+
+async def check_license_background():
+    """
+    Tarea en background que mantiene actualizado el estado de la licencia.
+    Solo hace la verificación completa cuando el archivo cambia o cuando el estado
+    puede cambiar por tiempo; el resto del tiempo solo revisa el mtime del archivo.
+    """
+    print(f"🔄 Monitor de licencia iniciado (cambios de archivo cada {FILE_POLL_SECONDS}s)")
+    loop = asyncio.get_running_loop()
+    last_signature = object()  # Fuerza la primera verificación
+
     while True:
         try:
-            from public.app_state_resolver import get_app_state
-            
-            if LICENSE_PATH.exists():
-                state = get_app_state(str(LICENSE_PATH))
-                
-                # Actualizar estado global
-                _license_state["last_check"] = datetime.now()
-                _license_state["state"] = state["state"]
-                _license_state["allow_usage"] = state["allow_usage"]
-                _license_state["user_message"] = state["user_message"]
-                _license_state["days_remaining"] = state["days_remaining"]
-                
-                # Log si hay cambios importantes
-                if not state["allow_usage"]:
-                    print(f"⚠️ LICENCIA BLOQUEADA: {state['user_message']}")
-                elif state["show_warning"]:
-                    print(f"⚠️ {state['user_message']}")
-                
+            signature = _license_signature()
+            due = _seconds_until_next_change() <= 0 if LICENSE_PATH.exists() else False
+            if signature != last_signature or due:
+                last_signature = signature
+                await loop.run_in_executor(None, refresh_license_state)
+            wait = min(FILE_POLL_SECONDS, _seconds_until_next_change()) if signature else FILE_POLL_SECONDS
         except Exception as e:
-            print(f"❌ Error en verificación periódica de licencia: {e}")
-        
-        # Esperar hasta la siguiente verificación
-        await asyncio.sleep(CHECK_INTERVAL_SECONDS)
+            print(f"❌ Error en verificación de licencia: {e}")
+            set_license_error(e)
+            last_signature = object()  # Reintentar la verificación completa en el próximo ciclo
+            wait = FILE_POLL_SECONDS
+
+        await asyncio.sleep(max(wait, 0.05))
 
 
 def start_license_monitor():
@@ -76,4 +169,11 @@ def start_license_monitor():
     Inicia el monitor de licencia en background.
     Debe llamarse al iniciar la app FastAPI.
     """
+    # Primera verificación antes de atender requests: el middleware de licencia
+    # necesita un estado real desde el inicio
+    try:
+        refresh_license_state()
+    except Exception as e:
+        print(f"❌ Error en verificación inicial de licencia: {e}")
+        set_license_error(e)
     asyncio.create_task(check_license_background())
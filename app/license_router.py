@@ -3,11 +3,13 @@ license_router.py
 Endpoints API para consultar el estado de la licencia.
 """
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import os
 from pathlib import Path
 import sys
 
+from app import executors
+
 # Detectar directorio base
 if getattr(sys, 'frozen', False):
     BASE_DIR = Path(sys.executable).parent
@@ -18,9 +20,21 @@ LICENSE_PATH = BASE_DIR / "license.lic"
 
 router = APIRouter(prefix="/api/license", tags=["license"])
 
+STATUS_FIELDS = ("state", "allow_usage", "show_warning", "user_message", "days_remaining", "technical_status")
+
+
+def _monitored_state():
+    """
+    Estado que mantiene el monitor de licencia (se actualiza al cambiar license.lic y en
+    el instante exacto de cada cambio por tiempo). None si aún no hubo una verificación.
+    """
+    from app.license_monitor import get_license_state_ref
+    state = get_license_state_ref()
+    return state if state["last_check"] is not None else None
+
 
 @router.get("/status")
-def get_license_status():
+async def get_license_status():
     """
     Retorna el estado actual de la licencia.
     
@@ -32,8 +46,16 @@ def get_license_status():
         - days_remaining: int|None
         - technical_status: str (para debugging)
     """
+    # Sin E/S ni hilos: el frontend lo consulta seguido y no debe esperar detrás de trabajo pesado
+    state = _monitored_state()
+    if state is not None:
+        return {field: state.get(field) for field in STATUS_FIELDS}
+    return await executors.run_io(_resolve_status)
+
+
+def _resolve_status():
     try:
-        from public.app_state_resolver import get_app_state
+        from public.app_state_resolver import get_app_state_cached
     except ImportError:
         return JSONResponse(
             status_code=200,
@@ -59,7 +81,7 @@ def get_license_status():
         }
     
     try:
-        app_state = get_app_state(str(LICENSE_PATH))
+        app_state = get_app_state_cached(str(LICENSE_PATH))
         
         # Retornar solo campos relevantes para el frontend
         return {
@@ -82,7 +104,7 @@ def get_license_status():
 
 
 @router.get("/features")
-def get_license_features():
+async def get_license_features():
     """
     Retorna las features habilitadas por la licencia.
     
@@ -90,8 +112,15 @@ def get_license_features():
         - features: dict con features habilitadas
         - allow_usage: bool
     """
+    state = _monitored_state()
+    if state is not None:
+        return {"allow_usage": state["allow_usage"], "features": state["features"] or {}}
+    return await executors.run_io(_resolve_features)
+
+
+def _resolve_features():
     try:
-        from public.app_state_resolver import get_app_state, get_features
+        from public.app_state_resolver import get_app_state_cached, get_features
     except ImportError:
         return {
             "allow_usage": False,
@@ -106,7 +135,7 @@ def get_license_features():
         }
     
     try:
-        app_state = get_app_state(str(LICENSE_PATH))
+        app_state = get_app_state_cached(str(LICENSE_PATH))
         features = get_features(app_state)
         
         return {
@@ -121,16 +150,20 @@ def get_license_features():
 
 
 @router.get("/machine-id")
-def get_machine_id():
+def get_machine_id(refresh: bool = False):
     """
     Retorna el Machine ID de este equipo.
     Útil para generar nuevas licencias.
     
+    Args:
+        - refresh: recalcular desde el hardware en vez de usar el cache
+    
     Returns:
         - machine_id: str (hash SHA-256 de 64 caracteres)
     """
     try:
-        from public.fingerprint import generate_machine_id
+        from public.fingerprint import generate_machine_id, refresh_machine_id
+        from public.app_state_resolver import invalidate_app_state_cache
     except ImportError:
         raise HTTPException(
             status_code=500,
@@ -138,7 +171,12 @@ def get_machine_id():
         )
     
     try:
-        machine_id = generate_machine_id()
+        if refresh:
+            machine_id = refresh_machine_id()
+            # El estado de licencia cacheado depende del machine_id
+            invalidate_app_state_cache()
+        else:
+            machine_id = generate_machine_id()
         return {
             "machine_id": machine_id
         }
@@ -150,7 +188,7 @@ def get_machine_id():
 
 
 @router.get("/cached-status")
-def get_cached_status():
+async def get_cached_status():
     """
     Retorna el estado cacheado de la licencia (última verificación).
     Más rápido que /status porque no verifica en tiempo real.
@@ -179,3 +217,21 @@ def get_cached_status():
         "user_message": cached["user_message"],
         "days_remaining": cached["days_remaining"]
     }
+
+
+@router.get("/events")
+async def license_events_stream():
+    """
+    Stream SSE con el estado de la licencia.
+    Envía el estado actual al conectar y luego un evento "license" en cada
+    transición (cambio de archivo, aviso de vencimiento, expiración).
+    Reemplaza el sondeo periódico de /status desde el frontend.
+    """
+    from app.license_monitor import license_events, get_cached_license_state, public_state
+
+    initial = ("license", public_state(get_cached_license_state()))
+    return StreamingResponse(
+        license_events.stream(initial=initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
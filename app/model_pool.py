@@ -0,0 +1,359 @@
+"""
+model_pool.py
+Pool de réplicas de modelos de Whisper para transcripciones concurrentes.
+Un mismo módulo de PyTorch no se comparte entre hilos: cada transcripción toma una
+réplica (checkout) y la devuelve al terminar. Con los pesos mapeados en memoria
+(app/model_store.py) las réplicas comparten las páginas de pesos, así que una réplica
+extra cuesta poco más que sus activaciones.
+Además limita cuántas inferencias admite el proceso: los requests interactivos que
+superan la capacidad reciben 429 en vez de competir por los mismos núcleos.
+"""
+import gc
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+# Configuración
+DEFAULT_MODEL = os.getenv("WHISPER_MODEL", "base")  # Modelo inicial; se puede cambiar en caliente
+MODEL_REPLICAS = int(os.getenv("MODEL_REPLICAS", "0"))  # 0 = según núcleos e hilos por réplica
+THREADS_PER_REPLICA = int(os.getenv("MODEL_THREADS_PER_REPLICA", "4"))
+POOL_WAIT_SECONDS = float(os.getenv("MODEL_POOL_WAIT_SECONDS", "30"))  # Espera máxima antes de 429
+
+
+class ModelPoolBusy(Exception):
+    """Todas las réplicas están ocupadas y se agotó la espera."""
+
+
+def replica_count() -> int:
+    """Réplicas por modelo en este proceso."""
+    if MODEL_REPLICAS > 0:
+        return MODEL_REPLICAS
+    from app import workers
+    if workers._in_worker:
+        # Un worker de ProcessPoolExecutor ejecuta una tarea a la vez: más réplicas no se usarían
+        return 1
+    return max(1, (os.cpu_count() or 1) // max(1, THREADS_PER_REPLICA))
+
+
+def capacity() -> int:
+    """Inferencias simultáneas que este proceso puede atender sin contención."""
+    from app import workers
+    if workers.is_enabled():
+        return workers.INFERENCE_WORKERS
+    return replica_count()
+
+
+class ModelPool:
+    """Réplicas de un modelo; se cargan a demanda hasta `size`."""
+
+    def __init__(self, name: str, size: int, loader: Callable):
+        self.name = name
+        self.size = size
+        self._loader = loader
+        self._idle: List = []
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self.checkouts = 0
+        self.rejections = 0
+        self.load_seconds = 0.0
+        self.last_used = time.time()
+        self.footprint_bytes = None  # Memoria medida al cargar la primera réplica
+
+    def _load(self):
+        started = time.time()
+        rss_before = process_rss()
+        model = self._loader(self.name)
+        rss_after = process_rss()
+        if self.footprint_bytes is None and rss_before is not None and rss_after is not None:
+            self.footprint_bytes = max(rss_after - rss_before, 0)
+        self.load_seconds += time.time() - started
+        return model
+
+    def warm(self):
+        """Carga la primera réplica si aún no existe."""
+        with self.checkout():
+            pass
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        """
+        Toma una réplica libre (o carga una nueva si hay cupo) y la devuelve al salir.
+        Con timeout, lanza ModelPoolBusy si no se libera ninguna a tiempo.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        load = False
+        with self._cond:
+            self._waiting += 1
+            try:
+                while not self._idle and self._created >= self.size:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.rejections += 1
+                        raise ModelPoolBusy(f"Todas las réplicas de '{self.name}' están ocupadas")
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            if self._idle:
+                model = self._idle.pop()
+            else:
+                # Reservar el cupo antes de cargar (fuera del lock: puede tardar)
+                self._created += 1
+                load = True
+            self._in_use += 1
+            self.checkouts += 1
+        if load:
+            try:
+                model = self._load()
+            except BaseException:
+                with self._cond:
+                    self._created -= 1
+                    self._in_use -= 1
+                    self._cond.notify()
+                raise
+        try:
+            yield model
+        finally:
+            with self._cond:
+                self._idle.append(model)
+                self._in_use -= 1
+                self.last_used = time.time()
+                self._cond.notify()
+
+    def loaded(self) -> int:
+        with self._cond:
+            return self._created
+
+    def idle_seconds(self) -> float:
+        with self._cond:
+            return 0.0 if self._in_use else time.time() - self.last_used
+
+    def unload_if_idle(self, idle_seconds: float) -> int:
+        """Libera las réplicas si ninguna se usa hace más de idle_seconds. Retorna cuántas."""
+        with self._cond:
+            if self._in_use or not self._idle or time.time() - self.last_used < idle_seconds:
+                return 0
+            released = len(self._idle)
+            self._idle.clear()
+            self._created = 0
+        return released
+
+    def drain(self) -> int:
+        """
+        Espera a que se devuelvan todas las réplicas en uso y las libera.
+        El pool ya no debe estar registrado (nadie nuevo lo usa). Retorna las réplicas liberadas.
+        """
+        with self._cond:
+            while self._in_use:
+                self._cond.wait()
+            released = len(self._idle)
+            self._idle.clear()
+            self._created = 0
+        return released
+
+    def status(self) -> Dict:
+        with self._cond:
+            return {
+                "model": self.name,
+                "replicas": self.size,
+                "loaded": self._created,
+                "in_use": self._in_use,
+                "waiting": self._waiting,
+                "checkouts": self.checkouts,
+                "rejections": self.rejections,
+                "load_seconds": round(self.load_seconds, 2),
+                "footprint_bytes": self.footprint_bytes,
+                "idle_seconds": round(time.time() - self.last_used) if not self._in_use else 0,
+            }
+
+
+_pools: Dict[str, ModelPool] = {}
+_pools_lock = threading.Lock()
+_threads_configured = False
+
+
+def _configure_threads(replicas: int):
+    """Reparte los núcleos entre réplicas (torch usa un pool de hilos por proceso)."""
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+    from app import workers
+    if replicas <= 1 or workers._in_worker:
+        return  # Los workers ya fijan sus hilos al iniciar
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // replicas))
+    except ImportError:
+        pass
+
+
+_default_model = DEFAULT_MODEL
+
+
+def get_default_model() -> str:
+    return _default_model
+
+
+def set_default_model(name: str):
+    """Fija el modelo por defecto de este proceso (los workers usan el de su pool)."""
+    global _default_model
+    _default_model = name
+
+
+def get_pool(name: str) -> ModelPool:
+    with _pools_lock:
+        if name not in _pools:
+            from app.inference import get_backend
+            size = replica_count()
+            _configure_threads(size)
+            _pools[name] = ModelPool(name, size, get_backend().load_model)
+        return _pools[name]
+
+
+def checkout_model(name: str, timeout: Optional[float] = None):
+    """Context manager: una réplica del modelo `name` para una transcripción."""
+    return get_pool(name).checkout(timeout)
+
+
+# --- Admisión: inferencias en curso iniciadas desde este proceso ---
+_admission: Optional[threading.BoundedSemaphore] = None
+_admission_lock = threading.Lock()
+
+
+def _get_admission() -> threading.BoundedSemaphore:
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = threading.BoundedSemaphore(capacity())
+        return _admission
+
+
+@contextmanager
+def admission(timeout: Optional[float] = None):
+    """
+    Reserva un cupo de inferencia antes de empezar (y antes de registrar el trabajo).
+    Con timeout lanza ModelPoolBusy si no hay cupo a tiempo; sin timeout espera (cola).
+    """
+    semaphore = _get_admission()
+    if not semaphore.acquire(timeout=timeout):
+        raise ModelPoolBusy("Capacidad de transcripción agotada; intenta de nuevo en unos segundos")
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+# --- Cambio de modelo en caliente ---
+def process_rss(pid: int = None) -> Optional[int]:
+    """Memoria residente (bytes) de un proceso; psutil si está, si no /proc (Linux)."""
+    pid = pid or os.getpid()
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def release_memory():
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+_swap = {"state": "idle"}
+_swap_lock = threading.Lock()
+
+
+def get_swap_status() -> Dict:
+    return dict(_swap)
+
+
+def _run_swap(name: str):
+    global _default_model
+    from app import workers
+    previous = _default_model
+    try:
+        started = time.time()
+        if workers.is_enabled():
+            # Pool de procesos nuevo con el modelo ya cargado en cada worker
+            old_workers = workers.swap_pool(name)
+            _swap.update(load_seconds=round(time.time() - started, 2))
+            _default_model = name  # Cambio atómico: los próximos trabajos usan el modelo nuevo
+            _swap.update(state="draining")
+            drain_started = time.time()
+            freed = 0
+            if old_workers is not None:
+                freed = old_workers.rss_bytes()
+                old_workers.shutdown(drain=True)
+        else:
+            get_pool(name).warm()
+            _swap.update(load_seconds=round(time.time() - started, 2))
+            _default_model = name
+            _swap.update(state="draining")
+            drain_started = time.time()
+            freed = 0
+            if previous != name:
+                with _pools_lock:
+                    old_pool = _pools.pop(previous, None)
+                if old_pool is not None:
+                    rss_before = process_rss()
+                    old_pool.drain()
+                    del old_pool
+                    release_memory()
+                    rss_after = process_rss()
+                    if rss_before is not None and rss_after is not None:
+                        freed = max(rss_before - rss_after, 0)
+        _swap.update(
+            state="done",
+            drain_seconds=round(time.time() - drain_started, 2),
+            freed_bytes=freed,
+            finished_at=time.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        print(f"✅ Modelo cambiado: {previous} → {name} (carga {_swap['load_seconds']}s, {freed / (1024 * 1024):.0f} MB liberados)")
+    except Exception as e:
+        _swap.update(state="failed", error=str(e), finished_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+        print(f"❌ Error cambiando el modelo a {name}: {e}")
+
+
+def swap_default_model(name: str) -> Dict:
+    """
+    Carga `name` en background y lo pone como modelo por defecto cuando está listo.
+    El modelo anterior se libera al terminar sus transcripciones en curso.
+    Lanza RuntimeError si ya hay un cambio en curso.
+    """
+    with _swap_lock:
+        if _swap.get("state") in ("loading", "draining"):
+            raise RuntimeError(f"Ya hay un cambio de modelo en curso (a '{_swap.get('to')}')")
+        _swap.clear()
+        _swap.update(state="loading", to=name, previous=_default_model,
+                     started_at=time.strftime("%Y-%m-%d %H:%M:%S"))
+    threading.Thread(target=_run_swap, args=(name,), daemon=True).start()
+    return get_swap_status()
+
+
+def status() -> Dict:
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {
+        "default_model": _default_model,
+        "capacity": capacity(),
+        "replicas_per_model": replica_count(),
+        "wait_seconds": POOL_WAIT_SECONDS,
+        "pools": [pool.status() for pool in pools],
+    }
@@ -0,0 +1,206 @@
+"""
+model_store.py
+Pesos de Whisper pre-convertidos para carga por memory-map.
+whisper.load_model() des-serializa el checkpoint completo (fp16) a memoria privada
+del proceso y luego lo copia a fp32: cada worker termina con su propia copia.
+Aquí el checkpoint se convierte una sola vez a fp32 contiguo y se carga con
+torch.load(mmap=True) + load_state_dict(assign=True): los tensores del modelo
+apuntan directamente a las páginas del archivo (mapeo privado, copy-on-write, que
+nunca se escribe), así el arranque es casi instantáneo y todos los workers
+comparten un único juego de pesos en el page cache del sistema.
+"""
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+# Detectar directorio base
+if getattr(sys, 'frozen', False):
+    BASE_DIR = Path(sys.executable).parent
+else:
+    BASE_DIR = Path(__file__).parent.parent
+
+# Configuración
+MMAP_DIR = Path(os.getenv("WHISPER_MMAP_DIR", str(BASE_DIR / "models" / "whisper-mmap")))
+MMAP_ENABLED = os.getenv("WHISPER_MMAP", "1") == "1"
+AUTO_CONVERT = os.getenv("WHISPER_MMAP_AUTOCONVERT", "1") == "1"  # Convertir en la primera carga
+FORMAT_VERSION = 1
+LOCK_WAIT_SECONDS = 1800   # Espera máxima a que otro proceso termine de convertir
+LOCK_STALE_SECONDS = 3600  # Un lock más viejo que esto quedó de un proceso muerto
+
+
+class ConvertedModelError(Exception):
+    """El archivo convertido existe pero no se puede leer (corrupto o de otra versión)."""
+
+
+def converted_path(name: str) -> Path:
+    return MMAP_DIR / f"{name}.fp32.pt"
+
+
+def _checkpoint_path(name: str) -> Path:
+    """Checkpoint original de Whisper (lo descarga si no está en la cache)."""
+    import whisper
+    download_root = os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+    download_root = os.path.join(download_root, "whisper")
+    return Path(whisper._download(whisper._MODELS[name], download_root, False))
+
+
+@contextmanager
+def _conversion_lock(target: Path):
+    """
+    Lock entre procesos (archivo creado con O_EXCL): con varios workers arrancando a la
+    vez, solo uno convierte y el resto espera y reutiliza el resultado.
+    """
+    lock_path = target.with_name(f"{target.name}.lock")
+    deadline = time.time() + LOCK_WAIT_SECONDS
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > LOCK_STALE_SECONDS:
+                    lock_path.unlink(missing_ok=True)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.time() > deadline:
+                raise TimeoutError(f"Otro proceso está convirtiendo '{target.name}' hace demasiado")
+            time.sleep(0.5)
+    try:
+        os.write(fd, str(os.getpid()).encode("ascii"))
+        os.close(fd)
+        yield
+    finally:
+        lock_path.unlink(missing_ok=True)
+
+
+def convert_model(name: str, force: bool = False) -> Path:
+    """
+    Convierte el checkpoint de Whisper a un archivo fp32 contiguo apto para mmap.
+    Retorna la ruta del archivo convertido.
+    """
+    import whisper
+
+    if name not in whisper._MODELS:
+        raise ValueError(f"Modelo '{name}' no disponible. Usa uno de: {', '.join(whisper.available_models())}")
+    target = converted_path(name)
+    if target.exists() and not force:
+        return target
+    MMAP_DIR.mkdir(parents=True, exist_ok=True)
+    with _conversion_lock(target):
+        # Otro proceso pudo terminar la conversión mientras se esperaba el lock
+        if target.exists() and not force:
+            return target
+        _write_converted(name, target)
+    return target
+
+
+def _write_converted(name: str, target: Path):
+    import torch
+    import whisper
+
+    started = time.time()
+    checkpoint = torch.load(_checkpoint_path(name), map_location="cpu")
+    state_dict = {
+        key: (tensor.float() if tensor.is_floating_point() else tensor).contiguous()
+        for key, tensor in checkpoint["model_state_dict"].items()
+    }
+    # Nombre temporal único por proceso: nunca se mezclan escrituras en el mismo archivo
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        torch.save({
+            "format": FORMAT_VERSION,
+            "dims": checkpoint["dims"],
+            "model_state_dict": state_dict,
+            "alignment_heads": whisper._ALIGNMENT_HEADS.get(name),
+        }, tmp_path)
+        os.replace(tmp_path, target)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    size_mb = target.stat().st_size / (1024 * 1024)
+    print(f"✅ Modelo '{name}' convertido para mmap ({size_mb:.0f} MB, {time.time() - started:.1f}s): {target}")
+
+
+def load_mapped_model(name: str):
+    """Carga el modelo desde el archivo convertido, mapeado en memoria (solo lectura)."""
+    import torch
+    from whisper.model import ModelDimensions, Whisper
+
+    try:
+        checkpoint = torch.load(converted_path(name), map_location="cpu", mmap=True, weights_only=True)
+    except TypeError:
+        raise  # torch antiguo sin mmap/weights_only: el archivo está bien
+    except Exception as e:
+        raise ConvertedModelError(f"No se pudo leer {converted_path(name).name}: {e}") from e
+    if not isinstance(checkpoint, dict) or checkpoint.get("format") != FORMAT_VERSION:
+        raise ConvertedModelError(f"Formato de pesos convertidos desconocido en {converted_path(name).name}")
+    dims = ModelDimensions(**checkpoint["dims"])
+    # Construir en el dispositivo "meta" (sin reservar memoria) y asignar los tensores mapeados
+    with torch.device("meta"):
+        model = Whisper(dims)
+    model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+    # Los buffers no persistentes no están en el state_dict: recrearlos en CPU
+    mask = torch.empty(dims.n_text_ctx, dims.n_text_ctx).fill_(float("-inf")).triu_(1)
+    model.decoder.register_buffer("mask", mask, persistent=False)
+    if checkpoint.get("alignment_heads"):
+        model.set_alignment_heads(checkpoint["alignment_heads"])
+    else:
+        all_heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+        all_heads[dims.n_text_layer // 2:] = True
+        model.register_buffer("alignment_heads", all_heads.to_sparse(), persistent=False)
+    leftover = [buf_name for buf_name, buf in model.named_buffers() if buf.is_meta]
+    if leftover:
+        raise ValueError(f"Buffers sin inicializar: {', '.join(leftover)}")
+    model.eval()
+    for param in model.parameters():
+        param.requires_grad_(False)
+    return model
+
+
+def load_model(name: str):
+    """
+    Carga un modelo de Whisper. Usa los pesos mapeados si están disponibles (o los
+    convierte la primera vez); si no, recurre a whisper.load_model().
+    """
+    import whisper
+
+    started = time.time()
+    mappable = MMAP_ENABLED and name in whisper._MODELS
+    if mappable:
+        import torch
+        # En GPU los pesos se copian a la tarjeta: mapear no aporta nada
+        mappable = not torch.cuda.is_available()
+    if mappable:
+        try:
+            if not converted_path(name).exists():
+                if not AUTO_CONVERT:
+                    raise FileNotFoundError(f"{converted_path(name)} no existe (ejecuta download_models.py)")
+                convert_model(name)
+            try:
+                model = load_mapped_model(name)
+            except ConvertedModelError as e:
+                # Archivo corrupto o de otra versión: reconvertir en vez de caer siempre a la carga normal
+                if not AUTO_CONVERT:
+                    raise
+                print(f"⚠️ {e}; reconvirtiendo '{name}'")
+                converted_path(name).unlink(missing_ok=True)
+                convert_model(name)
+                model = load_mapped_model(name)
+            print(f"✅ Modelo '{name}' mapeado en memoria ({time.time() - started:.2f}s)")
+            return model
+        except Exception as e:
+            # torch antiguo (sin mmap/assign), archivo corrupto, etc.
+            print(f"⚠️ No se pudo mapear el modelo '{name}', carga normal: {e}")
+    model = whisper.load_model(name)
+    print(f"✅ Modelo '{name}' cargado ({time.time() - started:.2f}s)")
+    return model
+
+
+if __name__ == "__main__":
+    # python -m app.model_store [modelos...]  → convierte los modelos indicados
+    names = sys.argv[1:] or [os.getenv("WHISPER_MODEL", "base")]
+    for model_name in names:
+        convert_model(model_name, force=True)
@@ -0,0 +1,305 @@
+"""
+storage.py
+Cuotas y retención para audio/ y transcripts/.
+- Mantiene un índice en memoria (bytes y fecha de cada archivo) actualizado al subir/borrar
+- Barrido incremental en background: elimina primero los audios más antiguos,
+  conservando las transcripciones (salvo que tengan su propia antigüedad máxima)
+- Rechaza subidas antes de escribir si no hay espacio suficiente
+"""
+import asyncio
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+# Detectar directorio base
+if getattr(sys, 'frozen', False):
+    BASE_DIR = Path(sys.executable).parent
+else:
+    BASE_DIR = Path(__file__).parent.parent
+
+AUDIO_DIR = BASE_DIR / "audio"
+TRANSCRIPTS_DIR = BASE_DIR / "transcripts"
+PARTIAL_DIR = AUDIO_DIR / ".partial"  # Subidas en curso (mismo disco → rename atómico)
+PCM_DIR = AUDIO_DIR / ".pcm"  # PCM temporal del modo borrador + refinado
+PCM_MAX_AGE_SECONDS = 86400
+
+MB = 1024 * 1024
+DAY = 86400
+
+# Configuración (0 = sin límite)
+MAX_AUDIO_BYTES = int(os.getenv("STORAGE_MAX_AUDIO_MB", "0")) * MB
+MAX_TOTAL_BYTES = int(os.getenv("STORAGE_MAX_TOTAL_MB", "0")) * MB
+MAX_AUDIO_AGE_DAYS = float(os.getenv("STORAGE_MAX_AUDIO_AGE_DAYS", "0"))
+MAX_TRANSCRIPT_AGE_DAYS = float(os.getenv("STORAGE_MAX_TRANSCRIPT_AGE_DAYS", "0"))
+MIN_FREE_BYTES = int(os.getenv("STORAGE_MIN_FREE_MB", "500")) * MB  # Por debajo se rechazan subidas
+# Con poco disco, eliminar también audios (los más antiguos). Desactivado por defecto:
+# son datos del usuario, solo se borran si el operador lo habilita explícitamente
+EVICT_ON_LOW_DISK = os.getenv("STORAGE_EVICT_ON_LOW_DISK", "0") == "1"
+SWEEP_INTERVAL_SECONDS = int(os.getenv("STORAGE_SWEEP_INTERVAL_SECONDS", "300"))
+SWEEP_MAX_EVICTIONS = 50     # Máximo de audios eliminados por barrido (trabajo acotado)
+FULL_RESCAN_EVERY = 12       # Re-escanear disco cada N barridos (cambios externos)
+
+
+class StorageFullError(Exception):
+    """No hay espacio (en disco o dentro de la cuota) para guardar un archivo."""
+
+
+# Índice: ruta -> (bytes, mtime)
+_index: Dict[str, tuple] = {}
+_totals = {"audio": 0, "transcripts": 0}
+_index_lock = threading.Lock()
+_sweeps = 0
+
+# Resultado del último barrido (para el endpoint de estado)
+_last_sweep = {
+    "at": None,
+    "evicted_audio": [],
+    "evicted_transcripts": [],
+    "freed_bytes": 0,
+}
+
+
+def _category(path: str) -> str:
+    return "transcripts" if Path(path).parent == TRANSCRIPTS_DIR else "audio"
+
+
+def _stored_size(path, st: os.stat_result) -> int:
+    """
+    Bytes que ocupa un archivo. Un audio que es hardlink de un blob (app/blobstore.py)
+    cuenta 0: sus bytes ya los cuenta el blob, así los duplicados no suman a la cuota.
+    """
+    if st.st_nlink > 1 and Path(path).parent == AUDIO_DIR:
+        return 0
+    return st.st_size
+
+
+def record_file(path: Path):
+    """Agrega o actualiza un archivo en el índice."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        forget_file(path)
+        return
+    key = str(path)
+    size = _stored_size(path, st)
+    with _index_lock:
+        old = _index.get(key)
+        if old:
+            _totals[_category(key)] -= old[0]
+        _index[key] = (size, st.st_mtime)
+        _totals[_category(key)] += size
+
+
+def forget_file(path: Path):
+    """Quita un archivo del índice (ya eliminado)."""
+    key = str(path)
+    with _index_lock:
+        old = _index.pop(key, None)
+        if old:
+            _totals[_category(key)] -= old[0]
+
+
+def rescan():
+    """Reconstruye el índice leyendo los directorios (os.scandir trae el stat en Windows)."""
+    index = {}
+    totals = {"audio": 0, "transcripts": 0}
+    for directory in (AUDIO_DIR, AUDIO_DIR / ".canonical", AUDIO_DIR / ".blobs", TRANSCRIPTS_DIR):
+        if not directory.exists():
+            continue
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    # En Windows el stat de scandir trae st_nlink = 0: los audios se re-consultan
+                    st = os.stat(entry.path) if directory == AUDIO_DIR else entry.stat()
+                    size = _stored_size(entry.path, st)
+                    index[entry.path] = (size, st.st_mtime)
+                    totals[_category(entry.path)] += size
+    global _index, _totals
+    with _index_lock:
+        _index = index
+        _totals = totals
+
+
+def _audio_name(path: str) -> str:
+    """Nombre lógico del audio (las copias canónicas cuentan como el mismo audio)."""
+    p = Path(path)
+    if p.parent.name == ".canonical":
+        from app import ingest
+        return ingest.original_name(p) if p.suffix != ".json" else p.name[:-len(".json")]
+    return p.name
+
+
+def _audio_groups() -> Dict[str, dict]:
+    """
+    Agrupa los archivos de audio por nombre lógico: bytes totales y fecha más reciente.
+    Para los audios del blobstore la fecha es la de su subida: un duplicado es hardlink
+    del blob y su mtime es el de la primera subida de ese contenido.
+    """
+    from app import blobstore
+    added = blobstore.added_times()
+    groups = {}
+    with _index_lock:
+        items = list(_index.items())
+    for path, (size, mtime) in items:
+        # Los blobs se liberan junto con su última referencia, no se desalojan solos
+        if _category(path) != "audio" or Path(path).parent.name == ".blobs":
+            continue
+        group = groups.setdefault(_audio_name(path), {"bytes": 0, "mtime": 0.0})
+        group["bytes"] += size
+        group["mtime"] = max(group["mtime"], mtime)
+    for name, group in groups.items():
+        if name in added:
+            group["mtime"] = added[name]
+    return groups
+
+
+def evict_audio(name: str) -> int:
+    """
+    Elimina un audio (original, copia canónica y forma de onda) conservando su transcripción.
+    El contenido se libera solo si ningún otro nombre referencia el mismo blob.
+    """
+    from app import blobstore, ingest, waveform
+    freed = 0
+    paths = [AUDIO_DIR / name] + [ingest.CANONICAL_DIR / f"{name}{ext}" for ext, _ in ingest.FORMATS.values()]
+    paths.append(ingest.report_path(name))
+    paths.append(waveform.peaks_path(name))
+    for path in paths:
+        if path.exists():
+            freed += _stored_size(path, path.stat())
+            path.unlink()
+        forget_file(path)
+    freed += blobstore.release(name)
+    return freed
+
+
+def _disk_free() -> int:
+    return shutil.disk_usage(AUDIO_DIR).free
+
+
+def usage() -> Dict:
+    with _index_lock:
+        totals = dict(_totals)
+    return {
+        "audio_bytes": totals["audio"],
+        "transcripts_bytes": totals["transcripts"],
+        "total_bytes": totals["audio"] + totals["transcripts"],
+        "disk_free_bytes": _disk_free(),
+    }
+
+
+def check_upload_space(expected_bytes: Optional[int]):
+    """
+    Verifica antes de escribir que una subida cabe en disco y en las cuotas.
+    Lanza StorageFullError si no cabe.
+    """
+    expected = expected_bytes or 0
+    if _disk_free() - expected < MIN_FREE_BYTES:
+        raise StorageFullError("No hay espacio suficiente en disco para guardar el audio")
+    current = usage()
+    if MAX_AUDIO_BYTES and current["audio_bytes"] + expected > MAX_AUDIO_BYTES:
+        raise StorageFullError("Se alcanzó la cuota de almacenamiento de audio")
+    if MAX_TOTAL_BYTES and current["total_bytes"] + expected > MAX_TOTAL_BYTES:
+        raise StorageFullError("Se alcanzó la cuota total de almacenamiento")
+
+
+def sweep() -> Dict:
+    """
+    Aplica la retención: antigüedad máxima y cuotas, eliminando primero los audios
+    más antiguos. Usa solo el índice en memoria; elimina como máximo
+    SWEEP_MAX_EVICTIONS audios por llamada.
+    """
+    now = time.time()
+    evicted_audio, evicted_transcripts, freed = [], [], 0
+
+    groups = _audio_groups()
+    oldest_first = sorted(groups.items(), key=lambda item: item[1]["mtime"])
+    for name, group in oldest_first:
+        if len(evicted_audio) >= SWEEP_MAX_EVICTIONS:
+            break
+        current = usage()
+        too_old = MAX_AUDIO_AGE_DAYS and now - group["mtime"] > MAX_AUDIO_AGE_DAYS * DAY
+        over_audio = MAX_AUDIO_BYTES and current["audio_bytes"] > MAX_AUDIO_BYTES
+        over_total = MAX_TOTAL_BYTES and current["total_bytes"] > MAX_TOTAL_BYTES
+        low_disk = EVICT_ON_LOW_DISK and current["disk_free_bytes"] < MIN_FREE_BYTES
+        if not (too_old or over_audio or over_total or low_disk):
+            # Lista ordenada por antigüedad: los siguientes tampoco cumplen
+            break
+        freed += evict_audio(name)
+        evicted_audio.append(name)
+
+    # PCM de borradores cuyo refinado nunca terminó
+    if PCM_DIR.exists():
+        for leftover in PCM_DIR.iterdir():
+            try:
+                if now - leftover.stat().st_mtime > PCM_MAX_AGE_SECONDS:
+                    leftover.unlink()
+            except OSError:
+                pass
+
+    if MAX_TRANSCRIPT_AGE_DAYS:
+        with _index_lock:
+            items = [(p, v) for p, v in _index.items() if _category(p) == "transcripts"]
+        for path, (size, mtime) in items:
+            if now - mtime > MAX_TRANSCRIPT_AGE_DAYS * DAY:
+                Path(path).unlink(missing_ok=True)
+                forget_file(path)
+                freed += size
+                evicted_transcripts.append(Path(path).name)
+
+    _last_sweep.update({
+        "at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "evicted_audio": evicted_audio,
+        "evicted_transcripts": evicted_transcripts,
+        "freed_bytes": freed,
+    })
+    if evicted_audio or evicted_transcripts:
+        print(f"🧹 Retención: {len(evicted_audio)} audios y {len(evicted_transcripts)} transcripciones eliminados ({freed} bytes)")
+    return dict(_last_sweep)
+
+
+def get_storage_status() -> Dict:
+    from app import blobstore
+    return {
+        "usage": usage(),
+        "dedup": blobstore.get_stats(),
+        "quotas": {
+            "max_audio_bytes": MAX_AUDIO_BYTES or None,
+            "max_total_bytes": MAX_TOTAL_BYTES or None,
+            "max_audio_age_days": MAX_AUDIO_AGE_DAYS or None,
+            "max_transcript_age_days": MAX_TRANSCRIPT_AGE_DAYS or None,
+            "min_free_bytes": MIN_FREE_BYTES,
+            "evict_on_low_disk": EVICT_ON_LOW_DISK,
+        },
+        "last_sweep": dict(_last_sweep),
+    }
+
+
+async def storage_manager_background():
+    """Tarea en background: barrido cada SWEEP_INTERVAL_SECONDS."""
+    global _sweeps
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            if _sweeps % FULL_RESCAN_EVERY == 0:
+                await loop.run_in_executor(None, rescan)
+            await loop.run_in_executor(None, sweep)
+        except Exception as e:
+            print(f"❌ Error en el barrido de almacenamiento: {e}")
+        _sweeps += 1
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+
+
+def start_storage_manager():
+    """
+    Inicia el gestor de almacenamiento en background.
+    Debe llamarse al iniciar la app FastAPI.
+    """
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    # Restos de subidas interrumpidas
+    for leftover in PARTIAL_DIR.iterdir():
+        leftover.unlink(missing_ok=True)
+    asyncio.create_task(storage_manager_background())
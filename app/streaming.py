@@ -0,0 +1,204 @@
+"""
+streaming.py
+Reproducción de audios subidos con soporte completo de HTTP Range (206), para que
+el frontend pueda saltar desde un timestamp de la transcripción al audio.
+- ETag / Last-Modified con If-None-Match, If-Modified-Since e If-Range
+- Memoria constante por request: el archivo se lee por bloques con pread, nunca entero
+- Envío zero-copy (sendfile) solo si el servidor ASGI anuncia la extensión
+  "http.response.zerocopysend" o "http.response.pathsend". uvicorn (con el que se
+  distribuye la app) no anuncia ninguna: con él siempre se envía por bloques con pread
+"""
+import mimetypes
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+import anyio
+from fastapi import APIRouter, HTTPException, Request
+from starlette.responses import Response
+
+from app.ingest import playback_path
+
+router = APIRouter(prefix="/audio", tags=["audio"])
+
+CHUNK_SIZE = 256 * 1024
+
+# mimetypes no conoce (o adivina mal según la plataforma) varios formatos de audio
+CONTENT_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".webm": "audio/webm",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg; codecs=opus",
+    ".flac": "audio/flac",
+    ".amr": "audio/amr",
+}
+
+
+def content_type_for(path: Path) -> str:
+    ext = path.suffix.lower()
+    if ext in CONTENT_TYPES:
+        return CONTENT_TYPES[ext]
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def make_etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range de un solo rango ("bytes=a-b", "bytes=a-", "bytes=-n").
+    Retorna (inicio, fin) inclusivo, None si el header no aplica (se responde el
+    archivo completo) o lanza ValueError si el rango no es satisfacible (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Multi-rango: se permite ignorarlo y responder 200 con el archivo completo
+        return None
+    first, sep, last = (part.strip() for part in spec.strip().partition("-"))
+    if not sep or (first == "" and last == ""):
+        return None
+    if not (first == "" or first.isdigit()) or not (last == "" or last.isdigit()):
+        return None
+    if first == "":
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("rango vacío")
+        start, end = max(size - suffix, 0), size - 1
+    else:
+        start = int(first)
+        if start >= size:
+            raise ValueError("rango fuera del archivo")
+        end = int(last) if last else size - 1
+        if start > end:
+            # Rango sintácticamente inválido: se ignora
+            return None
+    if start >= size:
+        raise ValueError("rango fuera del archivo")
+    return start, min(end, size - 1)
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_matches(request: Request, etag: str, last_modified: str) -> bool:
+    """If-Range: el rango solo se honra si el cliente tiene la versión actual."""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    return if_range.strip() in (etag, last_modified)
+
+
+class FileRangeResponse(Response):
+    """
+    Respuesta que envía [start, end] de un archivo sin cargarlo en memoria.
+    Usa sendfile vía extensiones ASGI si el servidor las ofrece (p. ej. granian para
+    pathsend); uvicorn no las ofrece, así que ahí siempre se usan bloques con pread.
+    """
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict,
+                 media_type: str, send_body: bool = True):
+        super().__init__(content=None, status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = send_body
+        self.headers["content-length"] = str(max(end - start + 1, 0))
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body or self.end < self.start:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        extensions = scope.get("extensions") or {}
+        count = self.end - self.start + 1
+
+        if "http.response.pathsend" in extensions and self.start == 0 and count == self.path.stat().st_size:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+
+        fd = await anyio.to_thread.run_sync(os.open, str(self.path), os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        try:
+            if "http.response.zerocopysend" in extensions:
+                await send({"type": "http.response.zerocopysend", "file": fd,
+                            "offset": self.start, "count": count, "more_body": False})
+                return
+            offset = self.start
+            remaining = count
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(_read_at, fd, min(CHUNK_SIZE, remaining), offset)
+                if not chunk:
+                    break
+                offset += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # El archivo se acortó durante el envío: cerrar el body igualmente
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            os.close(fd)
+
+
+def _read_at(fd: int, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    # Windows no tiene pread: el descriptor es propio de este request, así que seek es seguro
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+@router.api_route("/stream/{filename}", methods=["GET", "HEAD"])
+def stream_audio(filename: str, request: Request):
+    """Reproduce un audio con soporte de Range/206 y peticiones condicionales."""
+    if Path(filename).name != filename:
+        raise HTTPException(status_code=400, detail="Nombre de archivo inválido")
+    path = playback_path(filename)
+    try:
+        st = path.stat()
+        if not path.is_file():
+            raise FileNotFoundError(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Archivo de audio '{filename}' no encontrado")
+
+    size = st.st_size
+    etag = make_etag(st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    media_type = content_type_for(path)
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": etag,
+        "last-modified": last_modified,
+        "cache-control": "no-cache",  # Revalidar siempre: un audio puede reemplazarse con el mismo nombre
+    }
+    send_body = request.method != "HEAD"
+
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+        if byte_range is not None:
+            start, end = byte_range
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+            return FileRangeResponse(path, start, end, 206, headers, media_type, send_body)
+
+    return FileRangeResponse(path, 0, size - 1, 200, headers, media_type, send_body)
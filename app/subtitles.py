@@ -0,0 +1,217 @@
+"""
+subtitles.py
+Exportación de transcripciones a SRT, VTT, JSON y TSV a partir de los segmentos
+que Whisper ya produjo (sin volver a ejecutar inferencia).
+"""
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Formato de cada línea del .txt generado por transcribe_audio: "[12.34-15.67] texto"
+LINE_PATTERN = re.compile(r"^\[(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)\]\s?(.*)$")
+
+# Cache de salidas renderizadas: (base, formato, nivel) -> (firma, bytes)
+CACHE_MAX_ENTRIES = 64
+_render_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def segments_path(transcripts_dir: Path, base_name: str) -> Path:
+    """Ruta del archivo lateral con los segmentos de una transcripción."""
+    return transcripts_dir / f"{base_name}.segments.json"
+
+
+def save_segments(transcripts_dir: Path, base_name: str, segments: List[Dict], language: Optional[str] = None, extra: Optional[Dict] = None):
+    """Guarda los segmentos (y palabras si existen) junto a la transcripción .txt."""
+    data = {
+        "language": language,
+        "segments": [clean_segment(seg) for seg in segments],
+    }
+    if extra:
+        data.update(extra)
+    path = segments_path(transcripts_dir, base_name)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    tmp_path.replace(path)
+
+
+def clean_segment(seg: Dict) -> Dict:
+    """Solo conserva los campos necesarios para exportar (Whisper agrega tokens, logprobs, etc.)."""
+    clean = {
+        "start": round(float(seg["start"]), 3),
+        "end": round(float(seg["end"]), 3),
+        "text": seg["text"].strip(),
+    }
+    words = seg.get("words")
+    if words:
+        clean["words"] = [
+            {"start": round(float(w["start"]), 3), "end": round(float(w["end"]), 3), "word": w["word"].strip()}
+            for w in words
+        ]
+    return clean
+
+
+def parse_transcript_text(text: str) -> List[Dict]:
+    """Obtiene segmentos a partir del texto plano de una transcripción (líneas "[inicio-fin] texto")."""
+    segments = []
+    for line in text.splitlines():
+        match = LINE_PATTERN.match(line.strip())
+        if match:
+            segments.append({
+                "start": float(match.group(1)),
+                "end": float(match.group(2)),
+                "text": match.group(3).strip(),
+            })
+    return segments
+
+
+def load_segments(transcripts_dir: Path, base_name: str) -> Optional[Dict]:
+    """
+    Carga los segmentos de una transcripción.
+    Usa el archivo .segments.json si existe; si no (transcripciones antiguas),
+    los reconstruye desde el .txt.
+    """
+    path = segments_path(transcripts_dir, base_name)
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    txt_path = transcripts_dir / f"{base_name}.txt"
+    if txt_path.exists():
+        with open(txt_path, "r", encoding="utf-8") as f:
+            return {"language": None, "segments": parse_transcript_text(f.read())}
+    return None
+
+
+def sync_segments_from_text(transcripts_dir: Path, base_name: str, text: str):
+    """
+    Actualiza los segmentos tras una edición manual del .txt.
+    Conserva las palabras de los segmentos cuyo texto no cambió.
+    Si el texto editado no tiene líneas con marcas de tiempo, no se toca nada.
+    """
+    edited = parse_transcript_text(text)
+    if not edited:
+        return
+    current = load_segments(transcripts_dir, base_name) or {"language": None, "segments": []}
+    merged = []
+    for seg in edited:
+        old = _find_by_times(current.get("segments", []), seg)
+        if old and old.get("words") and old["text"] == seg["text"]:
+            seg["words"] = old["words"]
+        merged.append(seg)
+    extra = {k: v for k, v in current.items() if k not in ("language", "segments")}
+    save_segments(transcripts_dir, base_name, merged, language=current.get("language"), extra=extra)
+
+
+def _find_by_times(segments: List[Dict], target: Dict) -> Optional[Dict]:
+    # El .txt guarda tiempos con 2 decimales; comparar con esa precisión
+    for seg in segments:
+        if f"{seg['start']:.2f}" == f"{target['start']:.2f}" and f"{seg['end']:.2f}" == f"{target['end']:.2f}":
+            return seg
+    return None
+
+
+# --- Formateo de tiempos ---
+def format_timestamp(seconds: float, decimal_marker: str = ",", always_include_hours: bool = True) -> str:
+    milliseconds = int(round(max(seconds, 0.0) * 1000.0))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    hours_marker = f"{hours:02d}:" if always_include_hours or hours > 0 else ""
+    return f"{hours_marker}{minutes:02d}:{secs:02d}{decimal_marker}{milliseconds:03d}"
+
+
+def _cues(data: Dict, level: str) -> List[Dict]:
+    """Devuelve las unidades a renderizar: segmentos o palabras."""
+    if level == "segment":
+        return data["segments"]
+    cues = []
+    for seg in data["segments"]:
+        for w in seg.get("words", []):
+            cues.append({"start": w["start"], "end": w["end"], "text": w["word"]})
+    if not cues:
+        raise ValueError("La transcripción no tiene marcas de tiempo por palabra")
+    return cues
+
+
+def render_srt(data: Dict, level: str = "segment") -> str:
+    blocks = []
+    for i, cue in enumerate(_cues(data, level), start=1):
+        blocks.append(
+            f"{i}\n{format_timestamp(cue['start'])} --> {format_timestamp(cue['end'])}\n{cue['text']}\n"
+        )
+    return "\n".join(blocks)
+
+
+def render_vtt(data: Dict, level: str = "segment") -> str:
+    blocks = ["WEBVTT\n"]
+    for cue in _cues(data, level):
+        blocks.append(
+            f"{format_timestamp(cue['start'], '.')} --> {format_timestamp(cue['end'], '.')}\n{cue['text']}\n"
+        )
+    return "\n".join(blocks)
+
+
+def render_tsv(data: Dict, level: str = "segment") -> str:
+    # Igual que el writer TSV de Whisper: milisegundos enteros
+    lines = ["start\tend\ttext"]
+    for cue in _cues(data, level):
+        text = cue["text"].replace("\t", " ")
+        lines.append(f"{int(round(cue['start'] * 1000))}\t{int(round(cue['end'] * 1000))}\t{text}")
+    return "\n".join(lines) + "\n"
+
+
+def render_json(data: Dict, level: str = "segment") -> str:
+    if level == "word":
+        return json.dumps({"language": data.get("language"), "words": _cues(data, level)}, ensure_ascii=False)
+    return json.dumps(data, ensure_ascii=False)
+
+
+# formato -> (función, media type, extensión)
+RENDERERS = {
+    "srt": (render_srt, "application/x-subrip", "srt"),
+    "vtt": (render_vtt, "text/vtt", "vtt"),
+    "tsv": (render_tsv, "text/tab-separated-values", "tsv"),
+    "json": (render_json, "application/json", "json"),
+}
+
+
+def _signature(transcripts_dir: Path, base_name: str) -> tuple:
+    # Cambia cuando se modifica la transcripción (.txt) o sus segmentos
+    sig = []
+    for path in (segments_path(transcripts_dir, base_name), transcripts_dir / f"{base_name}.txt"):
+        try:
+            st = path.stat()
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def render_transcript(transcripts_dir: Path, base_name: str, fmt: str, level: str = "segment") -> Optional[bytes]:
+    """
+    Renderiza una transcripción en el formato pedido, usando cache.
+    La cache se invalida cuando cambia el .txt o el .segments.json.
+    Retorna None si la transcripción no existe.
+    """
+    renderer = RENDERERS[fmt][0]
+    key = (str(transcripts_dir), base_name, fmt, level)
+    signature = _signature(transcripts_dir, base_name)
+    with _cache_lock:
+        cached = _render_cache.get(key)
+        if cached and cached[0] == signature:
+            _render_cache.move_to_end(key)
+            return cached[1]
+    data = load_segments(transcripts_dir, base_name)
+    if data is None:
+        return None
+    content = renderer(data, level).encode("utf-8")
+    with _cache_lock:
+        _render_cache[key] = (signature, content)
+        _render_cache.move_to_end(key)
+        while len(_render_cache) > CACHE_MAX_ENTRIES:
+            _render_cache.popitem(last=False)
+    return content
@@ -1,14 +1,26 @@
 from fastapi import APIRouter, HTTPException, Body, Query, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pathlib import Path
 from fastapi import Response
 from docx import Document
-import whisper
 import os
 import sys
+import shutil
 import subprocess
 import json
+from contextlib import contextmanager
 import numpy as np
+from app.vad import apply_vad, remap_segments
+from app.ingest import resolve_audio_path
+from app.workers import run_in_worker
+from app import model_pool
+from app import governor
+from app import executors
+from app.inference import get_backend
+from app.events import EventBroadcaster
+from app.subtitles import (
+    RENDERERS, clean_segment, load_segments, render_transcript, save_segments, segments_path, sync_segments_from_text,
+)
 
 # Detectar el directorio base correcto
 if getattr(sys, 'frozen', False):
@@ -23,6 +35,12 @@ router = APIRouter(prefix="/transcript", tags=["transcript"])
 AUDIO_DIR = BASE_DIR / "audio"
 TRANSCRIPTS_DIR = BASE_DIR / "transcripts"
 TRANSCRIPTS_DIR.mkdir(exist_ok=True)
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.webm', '.ogg', '.aac', '.flac', '.amr')
+
+# Marcas de tiempo por palabra (más lento); se guardan para exportar subtítulos por palabra
+WORD_TIMESTAMPS = os.getenv("WHISPER_WORD_TIMESTAMPS", "0") == "1"
+# Pre-paso de detección de voz: omite los silencios antes de Whisper
+VAD_ENABLED = os.getenv("VAD_ENABLED", "0") == "1"
 
 # --- DOCX export ---
 def transcript_to_docx(transcript_path: Path) -> bytes:
@@ -38,7 +56,7 @@ def transcript_to_docx(transcript_path: Path) -> bytes:
     return buf.read()
 
 @router.get("/export_docx/{filename}")
-def export_transcript_docx(filename: str):
+async def export_transcript_docx(filename: str):
     # Permitir nombre con o sin .txt
     transcript_path = TRANSCRIPTS_DIR / filename
     if not transcript_path.exists():
@@ -50,7 +68,7 @@ def export_transcript_docx(filename: str):
                 raise HTTPException(status_code=404, detail="Transcripción no encontrada")
         else:
             raise HTTPException(status_code=404, detail="Transcripción no encontrada")
-    docx_bytes = transcript_to_docx(transcript_path)
+    docx_bytes = await executors.run_io(transcript_to_docx, transcript_path)
     docx_filename = transcript_path.stem + ".docx"
     return Response(
         content=docx_bytes,
@@ -60,42 +78,148 @@ def export_transcript_docx(filename: str):
         }
     )
 
+# --- Exportación de subtítulos (SRT/VTT/JSON/TSV) desde los segmentos guardados ---
+def transcript_base_name(filename: str) -> str:
+    """Nombre base de la transcripción a partir de "x", "x.txt" o el nombre del audio "x.mp3"."""
+    name = filename[:-4] if filename.endswith('.txt') else filename
+    if Path(name).suffix.lower() in AUDIO_EXTENSIONS:
+        name = Path(name).stem
+    return name
+
+@router.get("/export/{filename}")
+def export_transcript(
+    filename: str,
+    format: str = Query("srt", description="Formato: srt, vtt, json o tsv"),
+    level: str = Query("segment", description="segment o word (requiere marcas por palabra)"),
+):
+    if format not in RENDERERS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {format}. Usa: {', '.join(RENDERERS)}")
+    if level not in ("segment", "word"):
+        raise HTTPException(status_code=400, detail="level debe ser 'segment' o 'word'")
+    base_name = transcript_base_name(filename)
+    try:
+        content = render_transcript(TRANSCRIPTS_DIR, base_name, format, level)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if content is None:
+        raise HTTPException(status_code=404, detail="Transcripción no encontrada")
+    _, media_type, extension = RENDERERS[format]
+    return Response(
+        content=content,
+        media_type=f"{media_type}; charset=utf-8",
+        headers={
+            "Content-Disposition": f"attachment; filename={base_name}.{extension}"
+        }
+    )
+
+@contextmanager
+def inference_slot():
+    """Cupo de inferencia para un request interactivo; 429 si la capacidad está agotada."""
+    try:
+        with model_pool.admission(model_pool.POOL_WAIT_SECONDS):
+            yield
+    except model_pool.ModelPoolBusy as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "10"})
+    except governor.MemoryBudgetExceeded as e:
+        # Sin Retry-After si el audio no cabe nunca en el presupuesto
+        headers = None if e.permanent else {"Retry-After": "60"}
+        raise HTTPException(status_code=503, detail=str(e), headers=headers)
+
 @router.post("")
-def transcribe_on_demand(filename: str = Query(..., description="Nombre del archivo de audio")):
-    audio_path = AUDIO_DIR / filename
+async def transcribe_on_demand(
+    filename: str = Query(..., description="Nombre del archivo de audio"),
+    vad: bool = Query(None, description="Omitir silencios antes de transcribir (por defecto VAD_ENABLED)"),
+    mode: str = Query("full", description="full, o draft: borrador rápido y refinado en background"),
+):
+    return await executors.run_heavy(_transcribe_on_demand, filename, vad, mode)
+
+def _transcribe_on_demand(filename: str, vad: bool, mode: str):
+    if mode not in ("full", "draft"):
+        raise HTTPException(status_code=400, detail="Modo no soportado. Usa full o draft")
+    audio_path = resolve_audio_path(filename)
     if not audio_path.exists():
         raise HTTPException(status_code=404, detail=f"Archivo de audio '{filename}' no encontrado")
-    transcript_file = transcribe_audio(filename)
+    # Registrado como trabajo: si el backend se cae a mitad, se re-encola al reiniciar
+    from app.jobs import JobState, failed_job, run_inline
+    options = {"vad": vad} if vad is not None else {}
+    if mode == "draft":
+        options["draft"] = True
+    with inference_slot():
+        try:
+            result = run_inline(filename, model=DRAFT_MODEL if mode == "draft" else None, options=options)
+        except governor.MemoryBudgetExceeded as e:
+            # El trabajo ya volvió a la cola: 202 con su id (un reintento del cliente lo duplicaría)
+            job = failed_job(e)
+            if job is None or job["state"] != JobState.QUEUED:
+                raise
+            return JSONResponse(content={
+                "filename": filename,
+                "transcript": None,
+                "job_id": job["id"],
+                "message": f"{e}. La transcripción quedó en cola",
+            }, status_code=202)
+    transcript_file = result["transcript"]
     transcript_path = TRANSCRIPTS_DIR / transcript_file
     if transcript_path.exists():
         with open(transcript_path, "r", encoding="utf-8") as f:
             transcript_text = f.read()
     else:
         transcript_text = None
-    return {"filename": transcript_file, "transcript": transcript_text, "message": "Transcripción generada correctamente"}
+    data = load_segments(TRANSCRIPTS_DIR, transcript_path.stem) or {}
+    return {
+        "filename": transcript_file,
+        "transcript": transcript_text,
+        "vad": data.get("vad"),
+        "refine_job_id": result.get("refine_job"),
+        "message": f"Borrador generado; refinando con '{REFINE_MODEL}'" if mode == "draft" else "Transcripción generada correctamente",
+    }
+
+@router.get("/events")
+async def transcript_events_stream():
+    """
+    Eventos SSE de transcripciones: "draft" al tener el borrador, "refined" cuando el
+    refinado reemplazó el borrador, "refine_skipped" si el borrador se editó antes.
+    """
+    return StreamingResponse(
+        transcript_events.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _transcript_names():
+    return [f.name for f in TRANSCRIPTS_DIR.glob("*.txt")]
 
 @router.get("/list")
-def list_transcripts():
-    files = [f.name for f in TRANSCRIPTS_DIR.glob("*.txt")]
-    return {"transcripts": files}
+async def list_transcripts():
+    return {"transcripts": await executors.run_io(_transcript_names)}
 
 # Forzar ruta de ffmpeg para Whisper y subprocess
 FFMPEG_DIR = str(BASE_DIR / "ffmpeg")
 FFMPEG_PATH = str(BASE_DIR / "ffmpeg" / "ffmpeg.exe")
+SAMPLE_RATE = 16000
 
 # Agregar la carpeta ffmpeg al PATH (no solo el ejecutable)
 if os.path.exists(FFMPEG_PATH):
     os.environ["PATH"] = FFMPEG_DIR + os.pathsep + os.environ.get("PATH", "")
+else:
+    # Fuera del paquete de Windows (desarrollo, CI): el ffmpeg del sistema
+    FFMPEG_PATH = shutil.which("ffmpeg") or FFMPEG_PATH
 
-# Monkey-patch para que whisper use nuestro ffmpeg
-import whisper.audio
-original_load_audio = whisper.audio.load_audio
-
-def custom_load_audio(file: str, sr: int = 16000):
+# Whisper usa custom_load_audio en vez de su load_audio (se reemplaza al cargar
+# el backend de Whisper, ver app/inference.py)
+def custom_load_audio(file: str, sr: int = 16000, start: float = None, end: float = None):
+    # start/end (segundos) decodifican solo esa ventana: -ss/-to como opciones de
+    # entrada hacen que ffmpeg busque en el contenedor en vez de decodificar desde el inicio
+    seek = []
+    if start is not None:
+        seek += ["-ss", f"{start:.3f}"]
+    if end is not None:
+        seek += ["-to", f"{end:.3f}"]
     cmd = [
         FFMPEG_PATH,
         "-nostdin",
         "-threads", "0",
+        *seek,
         "-i", file,
         "-f", "s16le",
         "-ac", "1",
@@ -111,34 +235,260 @@ def custom_load_audio(file: str, sr: int = 16000):
     
     return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
 
-# Reemplazar la función original
-whisper.audio.load_audio = custom_load_audio
+DEFAULT_MODEL = model_pool.DEFAULT_MODEL  # WHISPER_MODEL; se cambia en caliente con POST /admin/model
+# Modo borrador + refinado: pasada rápida y luego una precisa en background
+DRAFT_MODEL = os.getenv("WHISPER_DRAFT_MODEL", "tiny")
+REFINE_MODEL = os.getenv("WHISPER_REFINE_MODEL", "small")
+PCM_DIR = AUDIO_DIR / ".pcm"  # PCM decodificado del borrador, reutilizado por el refinado
+
+# Avisos al frontend (SSE) cuando un borrador o su refinado están listos
+transcript_events = EventBroadcaster()
+
+# Réplicas de cada modelo por nombre (app/model_pool.py). Se cargan la primera vez que
+# se piden; con INFERENCE_WORKERS > 0 solo en los workers, nunca en el proceso de la API
+def get_model_pool(name: str = None):
+    return model_pool.get_pool(name or model_pool.get_default_model())
 
-model = whisper.load_model("base")  # Puedes cambiar a "small", "medium", etc.
+# Decodificación + inferencia. Devuelve solo datos serializables para poder
+# ejecutarse en un worker de inferencia (app/workers.py) o en este proceso.
+# pcm_path: leer el PCM ya decodificado (.npy) en vez de volver a decodificar;
+# save_pcm: guardar el PCM decodificado para una pasada posterior (borrador → refinado).
+def inference(audio_path: str, language: str = "es", model_name: str = None, vad: bool = False,
+              start: float = None, end: float = None, verbose: bool = True,
+              pcm_path: str = None, save_pcm: str = None):
+    if pcm_path and Path(pcm_path).exists():
+        audio = np.load(pcm_path).astype(np.float32) / 32768.0
+    else:
+        audio = custom_load_audio(audio_path, start=start, end=end)
+    if save_pcm:
+        # int16 sin pérdida (custom_load_audio parte de s16le): la mitad de espacio que float32
+        tmp_path = f"{save_pcm}.tmp.npy"
+        np.save(tmp_path, np.round(audio * 32768.0).clip(-32768, 32767).astype(np.int16))
+        os.replace(tmp_path, save_pcm)
+    output = {"segments": [], "language": None, "vad": None, "duration": audio.size / SAMPLE_RATE}
+    if audio.size == 0:
+        return output
+    time_map = None
+    if vad:
+        # Quitar silencios antes de la inferencia; los tiempos se remapean al audio original
+        audio, time_map, output["vad"] = apply_vad(audio)
+        print(f"VAD {Path(audio_path).name}: {output['vad']['skipped_seconds']}s de {output['vad']['total_seconds']}s omitidos")
+        if audio.size == 0:
+            return output
+    # Cada transcripción usa su propia réplica: un módulo de torch no se comparte entre hilos
+    with get_model_pool(model_name).checkout() as model:
+        result = model.transcribe(audio, verbose=verbose, language=language, word_timestamps=WORD_TIMESTAMPS)
+    segments = result.get("segments", [])
+    if time_map is not None:
+        segments = remap_segments(segments, time_map)
+    output["segments"] = [clean_segment(seg) for seg in segments]
+    output["language"] = result.get("language")
+    return output
 
 # Función para transcribir audio y guardar resultado
-def transcribe_audio(filename: str):
-    audio_path = AUDIO_DIR / filename
+def transcribe_audio(filename: str, vad: bool = None, model_name: str = None):
+    # Usa la copia canónica 16 kHz mono si existe (decodificación más rápida)
+    audio_path = resolve_audio_path(filename)
     if not audio_path.exists():
         raise FileNotFoundError(f"Archivo de audio '{filename}' no encontrado")
-    result = model.transcribe(str(audio_path), verbose=True, language="es")
-    segments = result.get("segments", [])
+    if vad is None:
+        vad = VAD_ENABLED
+    # Sin modelo explícito, el por defecto se resuelve al tomar la réplica (en el worker o en
+    # inference), no aquí: si un cambio en caliente termina mientras el gobernador hace esperar,
+    # el modelo retirado no se vuelve a cargar. Aquí solo se usa para proyectar la memoria.
+    projected_model = model_name or model_pool.get_default_model()
+    with governor.reserve(filename, governor.audio_duration(audio_path), projected_model):
+        result = run_in_worker(inference, str(audio_path), language="es", model_name=model_name, vad=vad)
+    segments = result["segments"]
+    base_name = Path(filename).stem
+    extra = {"vad": result["vad"]} if result["vad"] else None
+    # Guardar segmentos para exportar SRT/VTT/JSON/TSV sin volver a transcribir
+    save_segments(TRANSCRIPTS_DIR, base_name, segments, language=result["language"], extra=extra)
+    return write_transcript(base_name, segments)
+
+# --- Modo borrador + refinado ---
+def pcm_cache_path(filename: str) -> Path:
+    return PCM_DIR / f"{filename}.npy"
+
+def transcribe_draft(filename: str, vad: bool = None):
+    """
+    Primera pasada rápida con DRAFT_MODEL. Guarda el borrador, conserva el PCM
+    decodificado y encola el refinado con REFINE_MODEL. Retorna (transcripción, id del refinado).
+    """
+    audio_path = resolve_audio_path(filename)
+    if not audio_path.exists():
+        raise FileNotFoundError(f"Archivo de audio '{filename}' no encontrado")
+    if vad is None:
+        vad = VAD_ENABLED
+    PCM_DIR.mkdir(parents=True, exist_ok=True)
+    pcm_path = pcm_cache_path(filename)
+    with governor.reserve(filename, governor.audio_duration(audio_path), DRAFT_MODEL):
+        result = run_in_worker(inference, str(audio_path), language="es", model_name=DRAFT_MODEL, vad=vad,
+                               save_pcm=str(pcm_path))
+    base_name = Path(filename).stem
+    extra = {"pass": "draft", "model": DRAFT_MODEL}
+    if result["vad"]:
+        extra["vad"] = result["vad"]
+    save_segments(TRANSCRIPTS_DIR, base_name, result["segments"], language=result["language"], extra=extra)
+    transcript_file = write_transcript(base_name, result["segments"])
+    from app import jobs
+    refine = jobs.enqueue(filename, model=REFINE_MODEL, kind="refine", options={
+        "vad": vad,
+        "language": result["language"],
+        # Si el usuario edita el borrador antes de que termine el refinado, no se pisa su edición
+        "draft_mtime_ns": (TRANSCRIPTS_DIR / transcript_file).stat().st_mtime_ns,
+    })
+    transcript_events.publish("transcript", {
+        "filename": filename, "transcript": transcript_file, "stage": "draft", "model": DRAFT_MODEL,
+        "refine_job_id": refine["id"],
+    })
+    return transcript_file, refine["id"]
+
+def refine_transcript(filename: str, model_name: str = None, options: dict = None):
+    """
+    Segunda pasada con un modelo mayor sobre el mismo PCM del borrador (sin volver a
+    decodificar) y con el idioma ya detectado. Reemplaza el borrador de forma atómica.
+    """
+    options = options or {}
+    model_name = model_name or REFINE_MODEL
+    audio_path = resolve_audio_path(filename)
+    pcm_path = pcm_cache_path(filename)
+    if not audio_path.exists() and not pcm_path.exists():
+        raise FileNotFoundError(f"Archivo de audio '{filename}' no encontrado")
+    if audio_path.exists():
+        duration = governor.audio_duration(audio_path)
+    else:
+        duration = pcm_path.stat().st_size / (2 * SAMPLE_RATE)  # PCM int16 mono
+    with governor.reserve(filename, duration, model_name):
+        result = run_in_worker(inference, str(audio_path), language=options.get("language") or "es",
+                               model_name=model_name, vad=bool(options.get("vad")), verbose=False,
+                               pcm_path=str(pcm_path))
+    base_name = Path(filename).stem
+    transcript_path = TRANSCRIPTS_DIR / f"{base_name}.txt"
+    draft_mtime = options.get("draft_mtime_ns")
+    if draft_mtime and transcript_path.exists() and transcript_path.stat().st_mtime_ns != draft_mtime:
+        print(f"⚠️ Refinado de {filename} descartado: el borrador fue editado")
+        pcm_path.unlink(missing_ok=True)
+        transcript_events.publish("transcript", {
+            "filename": filename, "transcript": transcript_path.name, "stage": "refine_skipped", "model": model_name,
+        })
+        return transcript_path.name
+    extra = {"pass": "refined", "model": model_name}
+    if result["vad"]:
+        extra["vad"] = result["vad"]
+    # Ambos archivos se escriben en temporales y se reemplazan: nunca se ve un estado a medias
+    save_segments(TRANSCRIPTS_DIR, base_name, result["segments"], language=result["language"], extra=extra)
+    transcript_file = write_transcript(base_name, result["segments"])
+    pcm_path.unlink(missing_ok=True)
+    transcript_events.publish("transcript", {
+        "filename": filename, "transcript": transcript_file, "stage": "refined", "model": model_name,
+    })
+    return transcript_file
+
+def write_transcript(base_name: str, segments):
+    """Escribe el .txt agrupado por minuto a partir de los segmentos (reemplazo atómico)."""
     paragraphs = {}
     for seg in segments:
         minute = int(seg['start'] // 60)
         if minute not in paragraphs:
             paragraphs[minute] = []
         paragraphs[minute].append(f"[{seg['start']:.2f}-{seg['end']:.2f}] {seg['text']}")
-    base_name = audio_path.stem
     transcript_path = TRANSCRIPTS_DIR / f"{base_name}.txt"
-    with open(transcript_path, "w", encoding="utf-8") as f:
+    tmp_path = transcript_path.with_suffix(".txt.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
         for minute, texts in paragraphs.items():
             f.write(f"--- Minuto {minute} ---\n")
             f.write("\n".join(texts) + "\n\n")
+    os.replace(tmp_path, transcript_path)
     return transcript_path.name
 
+# --- Re-transcripción de una ventana de tiempo ---
+def expand_window(segments, start: float, end: float):
+    """Amplía la ventana para cubrir completos los segmentos que la cruzan (no se pierde texto)."""
+    for seg in segments:
+        if seg['start'] < end and seg['end'] > start:
+            start = min(start, seg['start'])
+            end = max(end, seg['end'])
+    return start, end
+
+def splice_segments(segments, new_segments, start: float, end: float):
+    """Reemplaza los segmentos dentro de [start, end) por los nuevos, manteniendo el orden."""
+    before = [seg for seg in segments if seg['end'] <= start]
+    after = [seg for seg in segments if seg['start'] >= end]
+    return before + list(new_segments) + after
+
+def offset_segments(segments, offset: float, limit: float):
+    """Lleva los tiempos de la ventana decodificada al tiempo del audio original."""
+    shifted = []
+    for seg in segments:
+        seg = dict(seg)
+        seg['start'] = min(seg['start'] + offset, limit)
+        seg['end'] = min(seg['end'] + offset, limit)
+        if seg.get('words'):
+            seg['words'] = [
+                {**w, 'start': min(w['start'] + offset, limit), 'end': min(w['end'] + offset, limit)}
+                for w in seg['words']
+            ]
+        shifted.append(seg)
+    return shifted
+
+@router.post("/window")
+async def retranscribe_window(
+    filename: str = Query(..., description="Nombre del archivo de audio"),
+    start: float = Query(..., ge=0, description="Inicio de la ventana (segundos)"),
+    end: float = Query(..., gt=0, description="Fin de la ventana (segundos)"),
+    model_name: str = Query(None, alias="model", description="Modelo de Whisper (opcional)"),
+    language: str = Query(None, description="Idioma (opcional, por defecto el de la transcripción)"),
+):
+    """
+    Vuelve a transcribir solo [start, end] de un audio y reemplaza esos segmentos
+    en la transcripción existente. Solo se decodifica la ventana pedida.
+    """
+    return await executors.run_heavy(_retranscribe_window, filename, start, end, model_name, language)
+
+def _retranscribe_window(filename: str, start: float, end: float, model_name: str = None, language: str = None):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end debe ser mayor que start")
+    if model_name and model_name not in get_backend().available_models():
+        raise HTTPException(status_code=400, detail=f"Modelo no soportado: {model_name}")
+    audio_path = resolve_audio_path(filename)
+    if not audio_path.exists():
+        raise HTTPException(status_code=404, detail=f"Archivo de audio '{filename}' no encontrado")
+    base_name = Path(filename).stem
+    data = load_segments(TRANSCRIPTS_DIR, base_name)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Transcripción no encontrada. Usa POST /transcript para generarla.")
+    segments = data.get("segments", [])
+    start, end = expand_window(segments, start, end)
+    projected_model = model_name or model_pool.get_default_model()  # Ver transcribe_audio
+    with inference_slot(), governor.reserve(filename, end - start, projected_model):
+        result = run_in_worker(
+            inference, str(audio_path), language=language or data.get("language") or "es",
+            model_name=model_name, start=start, end=end, verbose=False,
+        )
+    if result["duration"] == 0:
+        raise HTTPException(status_code=400, detail="La ventana está fuera de la duración del audio")
+    end = min(end, start + result["duration"])
+    new_segments = offset_segments(result["segments"], start, end)
+    merged = splice_segments(segments, new_segments, start, end)
+    extra = {k: v for k, v in data.items() if k not in ("language", "segments")}
+    save_segments(TRANSCRIPTS_DIR, base_name, merged, language=data.get("language"), extra=extra)
+    # Releer desde el sidecar para escribir el .txt con los segmentos ya normalizados
+    transcript_file = write_transcript(base_name, load_segments(TRANSCRIPTS_DIR, base_name)["segments"])
+    return {
+        "filename": transcript_file,
+        "start": round(start, 3),
+        "end": round(end, 3),
+        "segments": [{"start": seg['start'], "end": seg['end'], "text": seg['text'].strip()} for seg in new_segments],
+        "message": "Ventana re-transcrita correctamente",
+    }
+
+def _read_text(path: Path) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
 @router.get("/{filename}")
-def get_transcript(filename: str):
+async def get_transcript(filename: str):
     # Buscar el archivo de transcripción asociado al audio, permitiendo nombre con o sin .txt
     transcript_path = TRANSCRIPTS_DIR / filename
     if not transcript_path.exists():
@@ -151,8 +501,7 @@ def get_transcript(filename: str):
                 raise HTTPException(status_code=404, detail="Transcripción no encontrada")
         else:
             raise HTTPException(status_code=404, detail="Transcripción no encontrada")
-    with open(transcript_path, "r", encoding="utf-8") as f:
-        text = f.read()
+    text = await executors.run_io(_read_text, transcript_path)
     return {"filename": transcript_path.name, "text": text}
 
 @router.get("/download/{filename}")
@@ -175,6 +524,8 @@ def update_transcript(filename: str, text: str = Body(..., embed=True)):
             raise HTTPException(status_code=404, detail="Transcripción no encontrada")
     with open(transcript_path, "w", encoding="utf-8") as f:
         f.write(text)
+    # Mantener los segmentos (exportación SRT/VTT) alineados con la edición manual
+    sync_segments_from_text(TRANSCRIPTS_DIR, transcript_path.stem, text)
     return {"filename": transcript_path.name, "message": "Transcripción actualizada"}
 
 @router.delete("/{filename}")
@@ -188,4 +539,7 @@ def delete_transcript(filename: str):
         else:
             raise HTTPException(status_code=404, detail="Transcripción no encontrada")
     transcript_path.unlink()
+    segments_file = segments_path(TRANSCRIPTS_DIR, transcript_path.stem)
+    if segments_file.exists():
+        segments_file.unlink()
     return {"filename": transcript_path.name, "message": "Transcripción eliminada"}
\ No newline at end of file
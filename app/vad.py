@@ -0,0 +1,147 @@
+"""
+vad.py
+Detección de actividad de voz (VAD) por energía, vectorizada con NumPy.
+Se usa antes de Whisper para no procesar (ni alucinar texto en) tramos de silencio.
+Guarda un mapa de tiempos para que los segmentos sigan refiriéndose al audio original.
+"""
+from typing import Dict, List, Tuple
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Configuración por defecto
+FRAME_MS = 30            # Tamaño de cada ventana de análisis
+MIN_SPEECH_MS = 250      # Tramos de voz más cortos se descartan (clics, golpes)
+MIN_SILENCE_MS = 600     # Silencios más cortos se consideran parte de la voz
+PAD_MS = 200             # Margen alrededor de cada tramo de voz
+THRESHOLD_OVER_FLOOR_DB = 12.0  # Umbral relativo al ruido de fondo
+MAX_BELOW_LOUD_DB = 15.0        # El umbral nunca queda a menos de esto del percentil 90
+ABSOLUTE_FLOOR_DB = -55.0       # Nunca considerar voz por debajo de este nivel
+
+
+def frame_energy_db(audio: np.ndarray, frame_len: int) -> np.ndarray:
+    """Energía RMS en dB de cada ventana (la última ventana incompleta se rellena con ceros)."""
+    n_frames = int(np.ceil(audio.size / frame_len))
+    padded = np.zeros(n_frames * frame_len, dtype=np.float32)
+    padded[:audio.size] = audio
+    frames = padded.reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    return 20.0 * np.log10(rms + 1e-10)
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Inicios y fines (exclusivos) de las rachas True de una máscara booleana."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_speech(
+    audio: np.ndarray,
+    sr: int = SAMPLE_RATE,
+    frame_ms: int = FRAME_MS,
+    min_speech_ms: int = MIN_SPEECH_MS,
+    min_silence_ms: int = MIN_SILENCE_MS,
+    pad_ms: int = PAD_MS,
+) -> List[Tuple[int, int]]:
+    """
+    Detecta los tramos con voz.
+
+    Returns:
+        Lista de (inicio, fin) en muestras, ordenada y sin solapamientos.
+    """
+    if audio.size == 0:
+        return []
+    frame_len = max(1, int(sr * frame_ms / 1000))
+    energy = frame_energy_db(audio, frame_len)
+    noise_floor, loud = np.percentile(energy, [10, 90])
+    # Si casi no hay silencio el percentil 10 ya es voz: limitar el umbral por debajo del nivel alto
+    threshold = max(min(noise_floor + THRESHOLD_OVER_FLOOR_DB, loud - MAX_BELOW_LOUD_DB), ABSOLUTE_FLOOR_DB)
+    speech = energy > threshold
+
+    # Rellenar silencios cortos entre tramos de voz
+    starts, ends = _runs(~speech)
+    fill = ((ends - starts) < int(np.ceil(min_silence_ms / frame_ms))) & (starts > 0) & (ends < speech.size)
+    if fill.any():
+        marks = np.zeros(speech.size + 1, dtype=np.int32)
+        np.add.at(marks, starts[fill], 1)
+        np.add.at(marks, ends[fill], -1)
+        speech |= np.cumsum(marks)[:-1] > 0
+
+    # Descartar tramos de voz demasiado cortos
+    starts, ends = _runs(speech)
+    keep = (ends - starts) >= int(np.ceil(min_speech_ms / frame_ms))
+    starts, ends = starts[keep], ends[keep]
+    if starts.size == 0:
+        return []
+
+    # Aplicar margen y fusionar tramos que se solapan
+    pad = int(np.ceil(pad_ms / frame_ms))
+    starts = np.maximum(starts - pad, 0) * frame_len
+    ends = np.minimum((ends + pad) * frame_len, audio.size)
+    regions = []
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        if regions and s <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], max(regions[-1][1], e))
+        else:
+            regions.append((s, e))
+    return regions
+
+
+class TimeMap:
+    """Convierte tiempos del audio compactado (solo voz) a tiempos del audio original."""
+
+    def __init__(self, regions: List[Tuple[int, int]], sr: int = SAMPLE_RATE):
+        lengths = np.array([e - s for s, e in regions], dtype=np.float64) / sr
+        self.compact_starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1])) if regions else np.zeros(0)
+        self.compact_ends = self.compact_starts + lengths
+        self.original_starts = np.array([s for s, _ in regions], dtype=np.float64) / sr
+
+    def to_original(self, t: float, is_end: bool = False) -> float:
+        if self.compact_starts.size == 0:
+            return t
+        # Un fin justo en el borde de un tramo pertenece a ese tramo, no al siguiente
+        side = "left" if is_end else "right"
+        idx = int(np.searchsorted(self.compact_starts, t, side=side)) - 1
+        idx = min(max(idx, 0), self.compact_starts.size - 1)
+        offset = min(t - self.compact_starts[idx], self.compact_ends[idx] - self.compact_starts[idx])
+        return float(self.original_starts[idx] + max(offset, 0.0))
+
+
+def apply_vad(audio: np.ndarray, sr: int = SAMPLE_RATE) -> Tuple[np.ndarray, TimeMap, Dict]:
+    """
+    Elimina los tramos sin voz.
+
+    Returns:
+        (audio compactado, mapa de tiempos, estadísticas con segundos totales/omitidos)
+    """
+    regions = detect_speech(audio, sr)
+    if regions:
+        compact = np.concatenate([audio[s:e] for s, e in regions])
+    else:
+        compact = np.zeros(0, dtype=audio.dtype)
+    total = audio.size / sr
+    speech = compact.size / sr
+    stats = {
+        "total_seconds": round(total, 2),
+        "speech_seconds": round(speech, 2),
+        "skipped_seconds": round(total - speech, 2),
+        "skipped_ratio": round((total - speech) / total, 3) if total else 0.0,
+        "regions": len(regions),
+    }
+    return compact, TimeMap(regions, sr), stats
+
+
+def remap_segments(segments: List[Dict], time_map: TimeMap) -> List[Dict]:
+    """Lleva los tiempos de los segmentos (y palabras) al audio original."""
+    remapped = []
+    for seg in segments:
+        seg = dict(seg)
+        seg["start"] = time_map.to_original(seg["start"])
+        seg["end"] = max(time_map.to_original(seg["end"], is_end=True), seg["start"])
+        if seg.get("words"):
+            seg["words"] = [
+                {**w, "start": time_map.to_original(w["start"]), "end": time_map.to_original(w["end"], is_end=True)}
+                for w in seg["words"]
+            ]
+        remapped.append(seg)
+    return remapped
@@ -0,0 +1,212 @@
+"""
+waveform.py
+Pirámide de picos (mín/máx) multi-resolución para dibujar la forma de onda en el editor.
+Se calcula una sola vez por audio con reducciones vectorizadas de NumPy sobre el PCM de
+custom_load_audio y se guarda como sidecar binario en audio/.peaks/<archivo>.peaks.
+Cada nivel agrupa PYRAMID_FACTOR bins del anterior; el endpoint sirve el nivel que
+corresponde al ancho en píxeles pedido, así dibujar un audio de 3 horas pide kilobytes.
+"""
+import os
+import struct
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Detectar directorio base
+if getattr(sys, 'frozen', False):
+    BASE_DIR = Path(sys.executable).parent
+else:
+    BASE_DIR = Path(__file__).parent.parent
+
+AUDIO_DIR = BASE_DIR / "audio"
+PEAKS_DIR = AUDIO_DIR / ".peaks"
+
+# Configuración
+SAMPLE_RATE = 16000
+BASE_SAMPLES_PER_PEAK = int(os.getenv("WAVEFORM_SAMPLES_PER_PEAK", "256"))  # 16 ms por bin en el nivel 0
+PYRAMID_FACTOR = 4
+MIN_LEVEL_BINS = 512  # No generar niveles más gruesos que esto
+DECODE_CHUNK_SECONDS = 600  # Se decodifica por tramos: memoria acotada en audios largos
+
+# Formato: cabecera fija + (bins por nivel) + datos int8 intercalados [mín, máx] por nivel
+MAGIC = b"PEAK"
+VERSION = 1
+HEADER = struct.Struct("<4sHIIHHQ")  # magic, versión, sample rate, muestras/bin, factor, niveles, muestras
+LEVEL = struct.Struct("<Q")
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def peaks_path(filename: str) -> Path:
+    return PEAKS_DIR / f"{filename}.peaks"
+
+
+def _file_lock(filename: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(filename, threading.Lock())
+
+
+def _reduce(samples: np.ndarray, size: int):
+    """Mín/máx por bloques de `size` muestras (el último bloque puede ser parcial)."""
+    full = samples.size // size
+    blocks = samples[:full * size].reshape(full, size)
+    mins, maxs = blocks.min(axis=1), blocks.max(axis=1)
+    tail = samples[full * size:]
+    if tail.size:
+        mins = np.append(mins, tail.min())
+        maxs = np.append(maxs, tail.max())
+    return mins, maxs
+
+
+def _quantize(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.round(values * 127), -128, 127).astype(np.int8)
+
+
+def build_pyramid(audio_path: Path):
+    """
+    Calcula la pirámide de un audio. Retorna (niveles, total de muestras); cada nivel
+    es un array int8 de forma (bins, 2) con [mín, máx].
+    """
+    from app.transcribe import custom_load_audio
+
+    mins_parts: List[np.ndarray] = []
+    maxs_parts: List[np.ndarray] = []
+    total = 0
+    carry = np.zeros(0, dtype=np.float32)
+    start = 0.0
+    while True:
+        chunk = custom_load_audio(str(audio_path), start=start, end=start + DECODE_CHUNK_SECONDS)
+        total += chunk.size
+        samples = np.concatenate([carry, chunk]) if carry.size else chunk
+        # Margen de 1 s: ffmpeg puede devolver unas muestras menos al cortar por tiempo
+        last_chunk = chunk.size < (DECODE_CHUNK_SECONDS - 1) * SAMPLE_RATE
+        # Los bins incompletos se arrastran al siguiente tramo (salvo al final)
+        usable = samples.size if last_chunk else samples.size - samples.size % BASE_SAMPLES_PER_PEAK
+        if usable:
+            mins, maxs = _reduce(samples[:usable], BASE_SAMPLES_PER_PEAK)
+            mins_parts.append(mins)
+            maxs_parts.append(maxs)
+        carry = samples[usable:]
+        if last_chunk:
+            break
+        start += chunk.size / SAMPLE_RATE
+
+    mins = np.concatenate(mins_parts) if mins_parts else np.zeros(0, dtype=np.float32)
+    maxs = np.concatenate(maxs_parts) if maxs_parts else np.zeros(0, dtype=np.float32)
+    levels = [np.stack([_quantize(mins), _quantize(maxs)], axis=1)]
+    while levels[-1].shape[0] > MIN_LEVEL_BINS:
+        prev = levels[-1]
+        lo, _ = _reduce(prev[:, 0], PYRAMID_FACTOR)
+        _, hi = _reduce(prev[:, 1], PYRAMID_FACTOR)
+        levels.append(np.stack([lo, hi], axis=1))
+    return levels, total
+
+
+def write_peaks(filename: str, levels: List[np.ndarray], total_samples: int) -> Path:
+    PEAKS_DIR.mkdir(parents=True, exist_ok=True)
+    path = peaks_path(filename)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SAMPLE_RATE, BASE_SAMPLES_PER_PEAK,
+                            PYRAMID_FACTOR, len(levels), total_samples))
+        for level in levels:
+            f.write(LEVEL.pack(level.shape[0]))
+        for level in levels:
+            f.write(np.ascontiguousarray(level, dtype=np.int8).tobytes())
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_header(path: Path) -> Dict:
+    with open(path, "rb") as f:
+        magic, version, sample_rate, samples_per_peak, factor, n_levels, total = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Sidecar de picos inválido: {path.name}")
+        bins = [LEVEL.unpack(f.read(LEVEL.size))[0] for _ in range(n_levels)]
+    offsets = []
+    offset = HEADER.size + LEVEL.size * n_levels
+    for n in bins:
+        offsets.append(offset)
+        offset += n * 2
+    return {
+        "sample_rate": sample_rate,
+        "samples_per_peak": samples_per_peak,
+        "factor": factor,
+        "total_samples": total,
+        "bins": bins,
+        "offsets": offsets,
+    }
+
+
+def _is_stale(filename: str, path: Path) -> bool:
+    original = AUDIO_DIR / filename
+    return original.exists() and original.stat().st_mtime > path.stat().st_mtime
+
+
+def ensure_peaks(filename: str) -> Optional[Path]:
+    """Ruta del sidecar de picos, calculándolo si falta o está desactualizado."""
+    from app.ingest import resolve_audio_path
+
+    path = peaks_path(filename)
+    with _file_lock(filename):
+        if path.exists() and not _is_stale(filename, path):
+            return path
+        audio_path = resolve_audio_path(filename)
+        if not audio_path.exists():
+            return None
+        levels, total = build_pyramid(audio_path)
+        write_peaks(filename, levels, total)
+        print(f"✅ Forma de onda de {filename}: {len(levels)} niveles, {path.stat().st_size / 1024:.0f} KB")
+        return path
+
+
+def remove_peaks(filename: str):
+    peaks_path(filename).unlink(missing_ok=True)
+
+
+def get_peaks(filename: str, width: int, start: float = 0.0, end: Optional[float] = None) -> Optional[Dict]:
+    """
+    Picos para dibujar [start, end] en `width` píxeles: el nivel más grueso que aún
+    tiene al menos un bin por píxel. Solo se lee del disco el tramo pedido.
+    "peaks" es un array int8 (bins, 2) con [mín, máx] escalados a ±127.
+    """
+    path = ensure_peaks(filename)
+    if path is None:
+        return None
+    header = read_header(path)
+    sample_rate = header["sample_rate"]
+    duration = header["total_samples"] / sample_rate
+    start = min(max(start, 0.0), duration)
+    end = duration if end is None else min(max(end, start), duration)
+
+    level = 0
+    for candidate in range(len(header["bins"])):
+        spp = header["samples_per_peak"] * header["factor"] ** candidate
+        if (end - start) * sample_rate / spp >= width:
+            level = candidate
+        else:
+            break
+    spp = header["samples_per_peak"] * header["factor"] ** level
+    n_bins = header["bins"][level]
+    first = min(int(start * sample_rate // spp), n_bins)
+    last = min(int(np.ceil(end * sample_rate / spp)), n_bins)
+    if last > first:
+        data = np.memmap(path, dtype=np.int8, mode="r", offset=header["offsets"][level], shape=(n_bins, 2))
+        window = np.array(data[first:last])
+        del data
+    else:
+        window = np.zeros((0, 2), dtype=np.int8)
+    return {
+        "level": level,
+        "levels": len(header["bins"]),
+        "samples_per_peak": spp,
+        "seconds_per_peak": spp / sample_rate,
+        "start": first * spp / sample_rate,
+        "end": min(last * spp / sample_rate, duration),
+        "duration": duration,
+        "peaks": window,
+    }
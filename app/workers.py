@@ -0,0 +1,232 @@
+"""
+workers.py
+Pool supervisado de procesos para la inferencia de Whisper.
+El proceso de la API (uvicorn) no carga el modelo: envía cada transcripción a un
+worker por IPC local (pipes de multiprocessing). Si un worker muere (crash o falta
+de memoria) el pool se recrea y el servidor sigue atendiendo.
+"""
+import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+# Configuración
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))  # 0 = inferencia en el proceso de la API
+MAX_TASKS_PER_WORKER = int(os.getenv("INFERENCE_MAX_TASKS_PER_WORKER", "0")) or None  # Reciclar workers
+MAX_RETRIES_AFTER_CRASH = 1
+
+# True dentro de un proceso worker (evita re-despachar desde el propio worker)
+_in_worker = False
+
+
+def _init_worker(threads: int, model_name: str = None):
+    """Inicializa un worker: fija hilos de torch y carga el modelo (por defecto, el configurado)."""
+    global _in_worker
+    _in_worker = True
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    if model_name:
+        # Las transcripciones sin modelo explícito usan el del pool al que pertenece el worker
+        from app.model_pool import set_default_model
+        set_default_model(model_name)
+    from app.transcribe import get_model_pool
+    get_model_pool(model_name).warm()
+    print(f"✅ Worker de inferencia listo (pid {os.getpid()}, {threads} hilos)")
+
+
+def _worker_ready() -> int:
+    time.sleep(0.2)  # Mantener ocupado al worker para que el pool arranque todos los procesos
+    return os.getpid()
+
+
+class WorkerPool:
+    """Pool de procesos que se recrea automáticamente si un worker muere."""
+
+    def __init__(self, size: int, model_name: str = None):
+        self.size = size
+        self.model_name = model_name
+        self.closed = False
+        self.threads = max(1, (os.cpu_count() or 1) // size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.restarts = 0
+        self.in_flight = 0
+        self.last_used = time.time()
+        self.completed = 0
+        self.failed = 0
+        self.started_at = time.time()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        kwargs = {}
+        if MAX_TASKS_PER_WORKER:
+            kwargs["max_tasks_per_child"] = MAX_TASKS_PER_WORKER
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            # spawn: no heredar hilos ni sockets de uvicorn (y es lo único disponible en Windows)
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.threads, self.model_name),
+            **kwargs,
+        )
+
+    def _get_executor(self, track: bool = False) -> Optional[ProcessPoolExecutor]:
+        """
+        Executor vigente (lo crea si hace falta). None si el pool ya se cerró: nunca se
+        recrea un executor de un pool reemplazado. Con track, cuenta la tarea en in_flight
+        bajo el mismo lock para que release_idle_pool no lo cierre con trabajo pendiente.
+        """
+        with self._lock:
+            if self.closed:
+                return None
+            if self._executor is None:
+                self._executor = self._create_executor()
+            if track:
+                self.in_flight += 1
+            return self._executor
+
+    def _task_done(self):
+        with self._lock:
+            self.in_flight -= 1
+            self.last_used = time.time()
+
+    def _forward(self, fn, *args, **kwargs):
+        # Pool reemplazado (cambio de modelo o descarga por inactividad): usar el vigente
+        current = get_pool()
+        if current is self:
+            raise RuntimeError("El pool de workers de inferencia está detenido")
+        return current.run(fn, *args, **kwargs)
+
+    def _restart(self, broken: ProcessPoolExecutor):
+        with self._lock:
+            # Otro hilo puede haberlo reiniciado ya; un pool cerrado no se reinicia
+            if self._executor is broken and not self.closed:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._create_executor()
+                self.restarts += 1
+                print(f"⚠️ Worker de inferencia caído; pool reiniciado ({self.restarts} reinicios)")
+
+    def run(self, fn, *args, **kwargs):
+        """Ejecuta fn en un worker y espera el resultado (bloqueante)."""
+        for attempt in range(MAX_RETRIES_AFTER_CRASH + 1):
+            executor = self._get_executor(track=True)
+            if executor is None:
+                return self._forward(fn, *args, **kwargs)
+            try:
+                future = executor.submit(fn, *args, **kwargs)
+            except RuntimeError:
+                # Executor cerrado entre obtenerlo y enviar la tarea
+                self._task_done()
+                if self.closed:
+                    return self._forward(fn, *args, **kwargs)
+                raise
+            try:
+                result = future.result()
+                self.completed += 1
+                return result
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt == MAX_RETRIES_AFTER_CRASH:
+                    self.failed += 1
+                    raise RuntimeError("El worker de inferencia terminó inesperadamente (¿memoria insuficiente?)")
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self._task_done()
+
+    def status(self) -> Dict:
+        return {
+            "workers": self.size,
+            "threads_per_worker": self.threads,
+            "restarts": self.restarts,
+            "completed": self.completed,
+            "failed": self.failed,
+            "uptime_seconds": round(time.time() - self.started_at),
+        }
+
+    def warm(self):
+        """Arranca todos los workers (cada uno carga el modelo en su inicializador)."""
+        executor = self._get_executor()
+        if executor is None:
+            raise RuntimeError("El pool de workers de inferencia está detenido")
+        futures = [executor.submit(_worker_ready) for _ in range(self.size)]
+        return sorted({future.result() for future in futures})
+
+    def rss_bytes(self) -> int:
+        """Memoria residente total de los procesos worker."""
+        from app.model_pool import process_rss
+        with self._lock:
+            processes = dict(getattr(self._executor, "_processes", None) or {})
+        return sum(process_rss(pid) or 0 for pid in processes)
+
+    def shutdown(self, drain: bool = False):
+        """Detiene los workers. Con drain=True espera a que terminen las tareas en curso."""
+        with self._lock:
+            self.closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=drain, cancel_futures=not drain)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return INFERENCE_WORKERS > 0 and not _in_worker
+
+
+def get_pool() -> WorkerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from app.model_pool import get_default_model
+            _pool = WorkerPool(INFERENCE_WORKERS, get_default_model())
+        return _pool
+
+
+def swap_pool(model_name: str):
+    """
+    Crea un pool nuevo con `model_name` ya cargado y lo pone en servicio.
+    Retorna el pool anterior (sin detener) para drenarlo fuera del camino de los requests.
+    """
+    global _pool
+    new_pool = WorkerPool(INFERENCE_WORKERS, model_name)
+    new_pool.warm()
+    with _pool_lock:
+        old_pool, _pool = _pool, new_pool
+    return old_pool
+
+
+def release_idle_pool(idle_seconds: float) -> int:
+    """
+    Detiene los workers (y con ellos sus modelos) si no se usan hace más de idle_seconds.
+    El próximo trabajo crea un pool nuevo. Retorna la memoria que ocupaban.
+    """
+    global _pool
+    with _pool_lock:
+        pool = _pool
+        if pool is None or pool._executor is None or pool.in_flight or time.time() - pool.last_used < idle_seconds:
+            return 0
+        _pool = None
+    freed = pool.rss_bytes()
+    pool.shutdown(drain=True)
+    return freed
+
+
+def run_in_worker(fn, *args, **kwargs):
+    """Ejecuta fn en el pool de workers si está habilitado; si no, en este proceso."""
+    if is_enabled():
+        return get_pool().run(fn, *args, **kwargs)
+    return fn(*args, **kwargs)
+
+
+def shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown()
@@ -7,6 +7,7 @@ import whisper
 from pyannote.audio import Pipeline
 import torch
 from dotenv import load_dotenv
+from app.model_store import convert_model, MMAP_DIR
 
 # Cargar variables de entorno
 load_dotenv()
@@ -25,6 +26,9 @@ for model_name in whisper_models:
         model = whisper.load_model(model_name)
         print(f"  [OK] Modelo '{model_name}' descargado correctamente")
         
+        # Convertir a pesos fp32 mapeables (carga casi instantánea y compartida entre workers)
+        convert_model(model_name, force=True)
+        
         # Liberar memoria
         del model
         if torch.cuda.is_available():
@@ -34,6 +38,7 @@ for model_name in whisper_models:
 
 print("\n[OK] Todos los modelos de Whisper descargados")
 print(f"  Ubicación: {os.path.expanduser('~/.cache/whisper')}")
+print(f"  Pesos mapeables: {MMAP_DIR}")
 
 # ====== 2. DESCARGAR MODELO DE PYANNOTE ======
 print("\n[2/2] Descargando modelo de diarización (Pyannote)...")
@@ -73,6 +78,7 @@ print("RESUMEN")
 print("=" * 60)
 print("\nModelos descargados en:")
 print(f"  • Whisper: {os.path.expanduser('~/.cache/whisper')}")
+print(f"  • Whisper (mmap): {MMAP_DIR}")
 print(f"  • Pyannote: {os.path.expanduser('~/.cache/huggingface')}")
 print("\nProximos pasos:")
 print("  1. Verificar que los modelos se descargaron correctamente")
@@ -0,0 +1,300 @@
+"""
+Generador de carga para una instancia local del backend.
+
+Lanza requests concurrentes con una mezcla configurable de endpoints y reporta,
+en JSON, el throughput y la latencia (p50/p95/p99) total y por endpoint, para
+comparar cambios en el stack de servicio. Solo usa la biblioteca estándar.
+
+Ejemplos:
+    python loadtest.py --concurrency 32 --duration 30
+    python loadtest.py --mix list=5,transcript=3,docx=1,license=4,upload=1 --upload-seconds 10,60
+    python loadtest.py --requests 2000 --output resultados.json
+
+Para medir solo la capa HTTP sin modelos, iniciar el backend con INFERENCE_BACKEND=fake.
+"""
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import uuid
+import wave
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+ENDPOINTS = ("list", "transcript", "docx", "license", "upload")
+DEFAULT_MIX = "list=4,transcript=3,docx=1,license=2,upload=0"
+SAMPLE_RATE = 16000
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for item in text.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Endpoint desconocido: {name}. Usa: {', '.join(ENDPOINTS)}")
+        mix[name] = int(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("La mezcla no tiene ningún endpoint con peso > 0")
+    return mix
+
+
+def generate_wav(seconds: float) -> bytes:
+    """WAV 16 kHz mono: tono con ruido, para que el decodificador y el VAD tengan trabajo real."""
+    rng = random.Random(int(seconds * 1000))
+    n = int(seconds * SAMPLE_RATE)
+    samples = (
+        int(8000 * math.sin(2 * math.pi * 220 * i / SAMPLE_RATE) + rng.randint(-2000, 2000))
+        for i in range(n)
+    )
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(struct.pack(f"<{n}h", *samples))
+    return buffer.getvalue()
+
+
+def multipart(filename: str, data: bytes, content_type: str = "audio/wav") -> Tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8")
+    tail = f"\r\n--{boundary}--\r\n".encode("utf-8")
+    return head + data + tail, f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """Una conexión keep-alive por hilo; se reabre si el servidor la cierra."""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def request(self, method: str, path: str, body: bytes = None, headers: Dict = None) -> Tuple[int, bytes]:
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request(method, path, body=body, headers=headers or {})
+                response = self.conn.getresponse()
+                return response.status, response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                # Conexión keep-alive cerrada por el servidor: reintentar una vez con una nueva
+                self.close()
+                if attempt == 2:
+                    raise
+            except Exception:
+                self.close()
+                raise
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        url = urlsplit(args.url)
+        self.host, self.port = url.hostname or "127.0.0.1", url.port or 80
+        self.mix = args.mix
+        self.names = [name for name, weight in self.mix.items() if weight > 0]
+        self.weights = [self.mix[name] for name in self.names]
+        self.upload_sizes = args.upload_seconds
+        self.wavs = {seconds: generate_wav(seconds) for seconds in set(self.upload_sizes)} if self.mix.get("upload") else {}
+        self.transcripts: List[str] = []
+        self.uploaded: List[str] = []
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.lock = threading.Lock()
+        self.issued = 0
+        self.local = threading.local()
+
+    def client(self) -> Client:
+        if not hasattr(self.local, "client"):
+            self.local.client = Client(self.host, self.port, self.args.timeout)
+        return self.local.client
+
+    def _upload(self, client: Client, seconds: float) -> Tuple[int, bytes]:
+        filename = f"loadtest-{uuid.uuid4().hex[:12]}-{seconds:g}s.wav"
+        body, content_type = multipart(filename, self.wavs[seconds])
+        status, data = client.request(
+            "POST", f"/audio/upload?mode={self.args.upload_mode}", body=body,
+            headers={"Content-Type": content_type},
+        )
+        if status < 400:
+            with self.lock:
+                self.uploaded.append(filename)
+        return status, data
+
+    def call(self, endpoint: str, client: Client) -> Tuple[int, bytes]:
+        if endpoint == "list":
+            return client.request("GET", "/audio/list")
+        if endpoint == "license":
+            return client.request("GET", "/api/license/status")
+        if endpoint == "upload":
+            return self._upload(client, random.choice(self.upload_sizes))
+        name = quote(random.choice(self.transcripts))
+        if endpoint == "transcript":
+            return client.request("GET", f"/transcript/{name}")
+        return client.request("GET", f"/transcript/export_docx/{name}")
+
+    def prepare(self):
+        """Obtiene transcripciones existentes; si no hay y la mezcla las pide, sube un audio semilla."""
+        if not (self.mix.get("transcript") or self.mix.get("docx")):
+            return
+        client = Client(self.host, self.port, self.args.timeout)
+        status, data = client.request("GET", "/transcript/list")
+        if status == 200:
+            self.transcripts = json.loads(data).get("transcripts", [])
+        if not self.transcripts:
+            print("No hay transcripciones: subiendo un audio semilla...", file=sys.stderr)
+            self.wavs.setdefault(5, generate_wav(5))
+            status, data = self._upload(client, 5)
+            transcript = json.loads(data).get("transcript") if status == 200 else None
+            if not transcript:
+                client.close()
+                raise SystemExit(f"No se pudo crear la transcripción semilla ({status}): {data[:200]!r}")
+            self.transcripts = [f"{os.path.splitext(self.uploaded[-1])[0]}.txt"]
+        client.close()
+
+    def worker(self, deadline: Optional[float]):
+        client = self.client()
+        rng = random.Random()
+        while True:
+            with self.lock:
+                if self.args.requests and self.issued >= self.args.requests:
+                    break
+                self.issued += 1
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            endpoint = rng.choices(self.names, self.weights)[0]
+            started = time.perf_counter()
+            try:
+                status, _ = self.call(endpoint, client)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.samples[endpoint].append(elapsed)
+                self.statuses[endpoint][str(status)] += 1
+        client.close()
+
+    def cleanup(self):
+        client = Client(self.host, self.port, self.args.timeout)
+        for filename in self.uploaded:
+            try:
+                client.request("DELETE", f"/audio/{quote(filename)}")
+            except Exception:
+                pass
+        client.close()
+
+    def run(self) -> Dict:
+        self.prepare()
+        if self.args.warmup:
+            client = Client(self.host, self.port, self.args.timeout)
+            for endpoint in self.names:
+                if endpoint != "upload":
+                    self.call(endpoint, client)
+            client.close()
+        deadline = None if self.args.requests else time.monotonic() + self.args.duration
+        print(f"Carga: {self.args.concurrency} clientes contra {self.args.url}...", file=sys.stderr)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.args.concurrency) as pool:
+            for _ in range(self.args.concurrency):
+                pool.submit(self.worker, deadline)
+        elapsed = time.perf_counter() - started
+        if not self.args.keep_uploads:
+            self.cleanup()
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {
+            name: summarize(self.samples[name], self.statuses[name], elapsed)
+            for name in self.names if self.samples[name]
+        }
+        total_statuses = Counter()
+        for counter in self.statuses.values():
+            total_statuses.update(counter)
+        all_samples = [s for name in self.names for s in self.samples[name]]
+        return {
+            "url": self.args.url,
+            "concurrency": self.args.concurrency,
+            "mix": self.mix,
+            "upload_seconds": self.upload_sizes if self.mix.get("upload") else None,
+            "elapsed_seconds": round(elapsed, 3),
+            "total": summarize(all_samples, total_statuses, elapsed),
+            "endpoints": endpoints,
+        }
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Percentil por rango más cercano."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples: List[float], statuses: Counter, elapsed: float) -> Dict:
+    values = sorted(samples)
+    errors = sum(n for status, n in statuses.items() if not status.isdigit() or int(status) >= 400)
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(values) / len(values)) if values else 0.0,
+            "p50": ms(percentile(values, 50)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "max": ms(values[-1]) if values else 0.0,
+        },
+        "statuses": dict(statuses),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del backend de transcripción")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="URL base de la instancia")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de carga (si no se usa --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="Total de requests (en vez de --duration)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"Pesos por endpoint ({', '.join(ENDPOINTS)}). Por defecto: {DEFAULT_MIX}")
+    parser.add_argument("--upload-seconds", type=lambda v: [float(x) for x in v.split(",") if x],
+                        default=[5.0], help="Duraciones de los WAV generados para subir, p. ej. 5,60,300")
+    parser.add_argument("--upload-mode", choices=("full", "draft"), default="full", help="mode= de /audio/upload")
+    parser.add_argument("--timeout", type=float, default=300, help="Timeout por request (segundos)")
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="No calentar los endpoints antes de medir")
+    parser.add_argument("--keep-uploads", action="store_true", help="No borrar los audios subidos al terminar")
+    parser.add_argument("--output", help="Guardar el JSON también en este archivo")
+    args = parser.parse_args()
+
+    result = LoadTest(args).run()
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -33,7 +33,7 @@ def check_license():
     """
     # Importar aquí para evitar errores si public/ no existe aún
     try:
-        from public.app_state_resolver import get_app_state
+        from public.app_state_resolver import get_app_state_cached
     except ImportError:
         print("⚠️ Sistema de licencias no encontrado. Continuando sin verificación.")
         return None
@@ -45,7 +45,7 @@ def check_license():
         return None
     
     # Obtener estado de la aplicación
-    state = get_app_state(LICENSE_PATH)
+    state = get_app_state_cached(LICENSE_PATH)
     
     # Mostrar estado pero NO bloquear el servidor
     if not state["allow_usage"]:
@@ -66,6 +66,16 @@ def check_license():
     return state
 
 if __name__ == "__main__":
+    # Necesario para los workers de inferencia (multiprocessing) en el .exe de PyInstaller
+    import multiprocessing
+    multiprocessing.freeze_support()
+
+    # Modo worker: sin API, solo toma trabajos de la cola compartida (JOBS_DB)
+    if "--worker" in sys.argv:
+        from app.jobs import run_worker_node
+        run_worker_node()
+        sys.exit(0)
+
     print("🚀 Iniciando backend de transcripción...")
     
     # Verificar licencia antes de iniciar el servidor
@@ -13,9 +13,11 @@ Objetivo:
 - Hacer incómodo/confuso el crack
 """
 
-from typing import Dict, Tuple
-from datetime import datetime
-from .license_verifier import verify_license, read_license_file
+from typing import Dict, Optional, Tuple
+from datetime import datetime, timedelta
+import os
+import threading
+from .license_verifier import verify_license_detailed, PUBLIC_KEY_PATH
 
 
 # Estados de experiencia de usuario (UX)
@@ -28,6 +30,18 @@ class AppState:
 
 # Configuración de umbrales
 EXPIRING_THRESHOLD_DAYS = 3  # Días antes de expirar para mostrar avisos
+CACHE_MAX_SECONDS = 3600     # Re-verificación completa al menos cada hora (huella, .last_run)
+
+
+def parse_instant(value: str) -> datetime:
+    """
+    Fecha ISO 8601 como datetime naive en hora local (la misma referencia que datetime.now()).
+    Las fechas con zona horaria se convierten: compararlas con naive lanzaría TypeError.
+    """
+    instant = datetime.fromisoformat(value)
+    if instant.tzinfo is not None:
+        instant = instant.astimezone().replace(tzinfo=None)
+    return instant
 
 
 def calculate_days_remaining(expires_at_str: str) -> int:
@@ -41,7 +55,7 @@ def calculate_days_remaining(expires_at_str: str) -> int:
         int: Días restantes (puede ser negativo si ya expiró)
     """
     try:
-        expires_at = datetime.fromisoformat(expires_at_str)
+        expires_at = parse_instant(expires_at_str)
         now = datetime.now()
         delta = expires_at - now
         return delta.days
@@ -50,6 +64,11 @@ def calculate_days_remaining(expires_at_str: str) -> int:
 
 
 def get_app_state(license_path: str) -> Dict:
+    """Ver _resolve_app_state."""
+    return _resolve_app_state(license_path)[0]
+
+
+def _resolve_app_state(license_path: str) -> Tuple[Dict, Optional[Dict]]:
     """
     Resuelve el estado de la aplicación según la licencia.
     
@@ -62,7 +81,7 @@ def get_app_state(license_path: str) -> Dict:
         license_path: Ruta al archivo de licencia
         
     Returns:
-        dict con:
+        (estado, contenido de la licencia o None). El estado es un dict con:
         - state: str (ACTIVE, EXPIRING_SOON, EXPIRED, BLOCKED)
         - allow_usage: bool (True si puede usar la app)
         - show_warning: bool (True si mostrar aviso)
@@ -72,8 +91,8 @@ def get_app_state(license_path: str) -> Dict:
         - technical_status: str (estado técnico original, para logs)
     """
     
-    # Verificar licencia (estado técnico)
-    technical_status, technical_reason = verify_license(license_path)
+    # Verificar licencia (estado técnico); se reutiliza el contenido ya leído
+    technical_status, technical_reason, license_data = verify_license_detailed(license_path)
     
     result = {
         "state": None,
@@ -88,7 +107,6 @@ def get_app_state(license_path: str) -> Dict:
     # 1️⃣ Licencia válida → Calcular días restantes
     if technical_status == "valid":
         try:
-            license_data = read_license_file(license_path)
             expires_at = license_data.get("expires_at")
             days_remaining = calculate_days_remaining(expires_at)
             
@@ -164,7 +182,101 @@ def get_app_state(license_path: str) -> Dict:
         # - "machine_id no coincide"
         # Eso es regalar el mapa del tesoro 🗺️
     
-    return result
+    return result, license_data
+
+
+def next_state_change(license_data: Optional[Dict], now: datetime) -> datetime:
+    """
+    Próximo instante en que el estado puede cambiar sin que cambie el archivo:
+    cambio de días restantes, expiración, not_before/issued_at futuros, medianoche
+    o, como máximo, CACHE_MAX_SECONDS.
+    """
+    candidates = [
+        now + timedelta(seconds=CACHE_MAX_SECONDS),
+        datetime.combine(now.date() + timedelta(days=1), datetime.min.time()),
+    ]
+    if isinstance(license_data, dict):
+        for field in ("not_before", "issued_at", "expires_at"):
+            try:
+                instant = parse_instant(license_data[field])
+                if instant > now:
+                    candidates.append(instant)
+            except Exception:
+                continue
+        try:
+            expires_at = parse_instant(license_data["expires_at"])
+            remaining = expires_at - now
+            if remaining.days >= 0:
+                # days_remaining = (expires_at - now).days baja en expires_at - N días
+                boundary = expires_at - timedelta(days=remaining.days)
+                if boundary > now:
+                    candidates.append(boundary)
+        except Exception:
+            pass
+    return min(candidates)
+
+
+# Cache del estado verificado: ruta -> dict con firma de archivos, estado y vigencia
+_state_cache = {}
+_state_cache_lock = threading.Lock()
+
+
+def _files_signature(license_path: str) -> Tuple:
+    sig = []
+    for path in (license_path, PUBLIC_KEY_PATH):
+        try:
+            st = os.stat(path)
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def get_app_state_cached(license_path: str) -> Dict:
+    """
+    Igual que get_app_state, pero reutiliza el último resultado mientras:
+    - license.lic y public.key no cambien (mtime y tamaño)
+    - no se llegue al próximo instante en que el estado puede cambiar (next_state_change)
+    - el reloj no haya retrocedido desde la última verificación completa
+    Cualquiera de esas condiciones fuerza la verificación completa (firma, huella, reloj).
+    """
+    now = datetime.now()
+    signature = _files_signature(license_path)
+    with _state_cache_lock:
+        entry = _state_cache.get(license_path)
+    if entry and entry["signature"] == signature and entry["checked_at"] <= now < entry["valid_until"]:
+        return _copy_state(entry["state"])
+
+    state, license_data = _resolve_app_state(license_path)
+    entry = {
+        "signature": signature,
+        "checked_at": now,
+        "valid_until": next_state_change(license_data, now),
+        "state": state,
+    }
+    with _state_cache_lock:
+        _state_cache[license_path] = entry
+    return _copy_state(state)
+
+
+def cached_state_valid_until(license_path: str) -> Optional[datetime]:
+    """Instante hasta el que vale el estado cacheado (None si no hay cache)."""
+    with _state_cache_lock:
+        entry = _state_cache.get(license_path)
+    return entry["valid_until"] if entry else None
+
+
+def invalidate_app_state_cache():
+    """Fuerza la verificación completa en la próxima consulta."""
+    with _state_cache_lock:
+        _state_cache.clear()
+
+
+def _copy_state(state: Dict) -> Dict:
+    copy = dict(state)
+    if copy.get("features") is not None:
+        copy["features"] = dict(copy["features"])
+    return copy
 
 
 def should_block_app(app_state: Dict) -> bool:
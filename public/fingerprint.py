@@ -2,12 +2,17 @@
 fingerprint.py
 Genera un identificador único de máquina (machine_id) combinando datos de hardware y sistema operativo.
 No expone datos crudos, solo el hash SHA-256 final.
+
+El cálculo completo (PowerShell/WMIC en Windows) se hace una vez por proceso y se
+guarda en memoria; refresh_machine_id() fuerza recalcularlo.
 """
 import hashlib
 import platform
+import threading
 import uuid
 import os
 import re
+from typing import Callable, Dict, Optional
 
 
 def get_mac_address() -> str:
@@ -65,14 +70,54 @@ def normalize_data(*args) -> str:
     return "|".join(norm)
 
 
-def generate_machine_id() -> str:
-    mac = get_mac_address()
-    disk = get_disk_serial()
-    cpu = get_cpu_info()
-    osinfo = get_os_info()
-    data = normalize_data(mac, disk, cpu, osinfo)
+# Fuentes de hardware, en el orden en que se combinan. Inyectables para pruebas:
+# las que no se pasen usan la de aquí.
+DEFAULT_SOURCES: Dict[str, Callable[[], str]] = {
+    "mac": get_mac_address,
+    "disk": get_disk_serial,
+    "cpu": get_cpu_info,
+    "os": get_os_info,
+}
+
+
+def compute_machine_id(sources: Optional[Dict[str, Callable[[], str]]] = None) -> str:
+    """Cálculo completo del machine_id a partir de las fuentes de hardware."""
+    sources = sources or {}
+    data = normalize_data(*(sources.get(name, default)() for name, default in DEFAULT_SOURCES.items()))
     hash_bytes = hashlib.sha256(data.encode("utf-8")).hexdigest()
     return hash_bytes.upper()
 
+
+class MachineIdCache:
+    """
+    machine_id calculado una vez por proceso, solo en memoria.
+    No se persiste: un archivo en disco podría editarse o copiarse y la huella
+    dejaría de estar ligada al hardware real (disco incluido).
+    """
+
+    def __init__(self, sources: Optional[Dict[str, Callable[[], str]]] = None):
+        self.sources = sources or DEFAULT_SOURCES
+        self._machine_id = None
+        self._lock = threading.Lock()
+
+    def get(self, refresh: bool = False) -> str:
+        with self._lock:
+            if self._machine_id is None or refresh:
+                self._machine_id = compute_machine_id(self.sources)
+            return self._machine_id
+
+
+_default_cache = MachineIdCache()
+
+
+def generate_machine_id() -> str:
+    """machine_id de este equipo (cacheado; ver MachineIdCache)."""
+    return _default_cache.get()
+
+
+def refresh_machine_id() -> str:
+    """Recalcula el machine_id desde el hardware y actualiza el cache."""
+    return _default_cache.get(refresh=True)
+
 if __name__ == "__main__":
-    print("Machine ID:", generate_machine_id())
+    print("Machine ID:", refresh_machine_id())
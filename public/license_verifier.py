@@ -2,16 +2,14 @@ def verify_license_hash(payload: dict) -> bool:
     """
     Verifica que el campo license_hash sea igual al SHA-256 del payload canónico sin el propio license_hash.
     """
-    import copy
     import json
     import hashlib
     import base64
     if 'license_hash' not in payload:
         return False
     license_hash = payload['license_hash']
-    # Copiar y eliminar license_hash
-    payload_no_hash = copy.deepcopy(payload)
-    del payload_no_hash['license_hash']
+    # Payload sin license_hash (copia superficial: json.dumps no modifica los valores)
+    payload_no_hash = {k: v for k, v in payload.items() if k != 'license_hash'}
     # Canonicalizar JSON
     canonical = json.dumps(payload_no_hash, sort_keys=True, separators=(",", ":"))
     hash_bytes = hashlib.sha256(canonical.encode('utf-8')).digest()
@@ -68,10 +66,22 @@ os.makedirs(DATA_DIR, exist_ok=True)
 LAST_RUN_FILE = os.path.join(DATA_DIR, '.last_run')
 
 
+# Cache de claves públicas: ruta -> ((mtime_ns, size), clave)
+_public_key_cache = {}
+
+
 def load_public_key(path: str = PUBLIC_KEY_PATH) -> Ed25519PublicKey:
+    # Reutilizar la clave ya parseada mientras el archivo no cambie
+    st = os.stat(path)
+    signature = (st.st_mtime_ns, st.st_size)
+    cached = _public_key_cache.get(path)
+    if cached and cached[0] == signature:
+        return cached[1]
     with open(path, 'rb') as f:
         key_data = f.read()
-    return Ed25519PublicKey.from_public_bytes(key_data)
+    public_key = Ed25519PublicKey.from_public_bytes(key_data)
+    _public_key_cache[path] = (signature, public_key)
+    return public_key
 
 
 def read_license_file(license_path: str) -> Dict:
@@ -143,11 +153,13 @@ def verify_integrity(payload: dict) -> dict:
         return {'status': 'manipulated', 'reason': 'license_hash inválido o manipulado'}
     return {'status': 'ok'}
 
-def verify_signature(payload: dict, signature: str, public_key_path: str = PUBLIC_KEY_PATH) -> dict:
-    try:
-        public_key = load_public_key(public_key_path)
-    except Exception as e:
-        return {'status': 'manipulated', 'reason': f'Error cargando public.key: {e}'}
+def verify_signature(payload: dict, signature: str, public_key_path: str = PUBLIC_KEY_PATH,
+                     public_key: Ed25519PublicKey = None) -> dict:
+    if public_key is None:
+        try:
+            public_key = load_public_key(public_key_path)
+        except Exception as e:
+            return {'status': 'manipulated', 'reason': f'Error cargando public.key: {e}'}
     if not verify_signature_raw(payload, signature, public_key):
         return {'status': 'manipulated', 'reason': 'Firma digital inválida'}
     return {'status': 'ok'}
@@ -182,14 +194,16 @@ def verify_clock_rollback(now: datetime = None) -> dict:
         return {'status': 'clock_rollback', 'reason': 'Retroceso de reloj detectado'}
     return {'status': 'ok'}
 
-def verify_license(license_path: str, public_key_path: str = PUBLIC_KEY_PATH) -> Tuple[str, str]:
-    now = datetime.now()
-    try:
-        lic = read_license_file(license_path)
-    except Exception as e:
-        return 'manipulated', f'Error leyendo licencia: {e}'
-
-    # Coordinador: ejecuta todas las verificaciones y retorna el primer error
+def verify_license_content(lic: dict, now: datetime = None, public_key_path: str = PUBLIC_KEY_PATH,
+                           public_key: Ed25519PublicKey = None, check_machine: bool = True,
+                           check_time: bool = True) -> Tuple[str, str]:
+    """
+    Verificaciones que dependen solo del contenido de la licencia, en orden:
+    versión, estructura, hash, firma, machine_id (opcional) y fechas (opcional).
+    Retorna ('ok', '') o el primer error.
+    """
+    if now is None:
+        now = datetime.now()
     result = verify_version(lic)
     if result['status'] != 'ok':
         return result['status'], result['reason']
@@ -201,28 +215,157 @@ def verify_license(license_path: str, public_key_path: str = PUBLIC_KEY_PATH) ->
     result = verify_integrity(payload)
     if result['status'] != 'ok':
         return result['status'], result['reason']
-    result = verify_signature(payload, signature, public_key_path)
-    if result['status'] != 'ok':
-        return result['status'], result['reason']
-    result = verify_machine_binding(payload)
-    if result['status'] != 'ok':
-        return result['status'], result['reason']
-    result = verify_time_window(payload, now)
+    result = verify_signature(payload, signature, public_key_path, public_key)
     if result['status'] != 'ok':
         return result['status'], result['reason']
+    if check_machine:
+        result = verify_machine_binding(payload)
+        if result['status'] != 'ok':
+            return result['status'], result['reason']
+    if check_time:
+        result = verify_time_window(payload, now)
+        if result['status'] != 'ok':
+            return result['status'], result['reason']
+    return 'ok', ''
+
+def verify_license_detailed(license_path: str, public_key_path: str = PUBLIC_KEY_PATH) -> Tuple[str, str, Dict]:
+    """
+    Igual que verify_license pero también retorna el contenido de la licencia
+    (None si no se pudo leer), para no tener que leerla y parsearla otra vez.
+    """
+    now = datetime.now()
+    try:
+        lic = read_license_file(license_path)
+    except Exception as e:
+        return 'manipulated', f'Error leyendo licencia: {e}', None
+
+    # Coordinador: ejecuta todas las verificaciones y retorna el primer error
+    status, reason = verify_license_content(lic, now, public_key_path)
+    if status != 'ok':
+        return status, reason, lic
     result = verify_clock_rollback(now)
     if result['status'] != 'ok':
-        return result['status'], result['reason']
+        return result['status'], result['reason'], lic
     try:
         update_last_run(LAST_RUN_FILE, now)
     except Exception:
         pass  # No es crítico
-    return 'valid', 'Licencia válida'
+    return 'valid', 'Licencia válida', lic
+
+def verify_license(license_path: str, public_key_path: str = PUBLIC_KEY_PATH) -> Tuple[str, str]:
+    status, reason, _ = verify_license_detailed(license_path, public_key_path)
+    return status, reason
+
+# --- Verificación masiva (lado proveedor) ---
+# Clave pública parseada una sola vez por proceso worker
+_batch_public_key = None
+_batch_options = {}
+
+
+def _init_batch_worker(public_key_path: str, check_machine: bool, check_time: bool):
+    global _batch_public_key, _batch_options
+    _batch_public_key = load_public_key(public_key_path)
+    _batch_options = {'check_machine': check_machine, 'check_time': check_time}
+
+
+def _verify_batch_item(license_path: str) -> dict:
+    import time
+    t0 = time.perf_counter()
+    item = {'path': license_path}
+    try:
+        lic = read_license_file(license_path)
+    except Exception as e:
+        item.update(status='manipulated', reason=f'Error leyendo licencia: {e}')
+    else:
+        try:
+            status, reason = verify_license_content(lic, public_key=_batch_public_key, **_batch_options)
+        except Exception as e:
+            status, reason = 'manipulated', f'Error verificando licencia: {e}'
+        item.update(status='valid' if status == 'ok' else status, reason=reason or 'Licencia válida')
+        if isinstance(lic, dict):
+            item['machine_id'] = lic.get('machine_id')
+            item['expires_at'] = lic.get('expires_at')
+            item['license_version'] = lic.get('license_version')
+    item['elapsed_ms'] = round((time.perf_counter() - t0) * 1000, 3)
+    return item
+
+
+def collect_license_paths(source: str) -> list:
+    """
+    Rutas a verificar: todos los .lic de un directorio (recursivo) o un manifiesto
+    (.json con una lista de rutas, o texto con una ruta por línea; relativas al manifiesto).
+    """
+    from pathlib import Path
+    src = Path(source)
+    if src.is_dir():
+        return sorted(str(p) for p in src.rglob('*.lic'))
+    with open(src, 'r', encoding='utf-8') as f:
+        if src.suffix.lower() == '.json':
+            entries = json.load(f)
+        else:
+            entries = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [str(p if Path(p).is_absolute() else src.parent / p) for p in entries]
+
+
+def verify_batch(paths: list, public_key_path: str = PUBLIC_KEY_PATH, workers: int = None,
+                 check_machine: bool = True, check_time: bool = True) -> dict:
+    """
+    Verifica muchas licencias en paralelo (pool de procesos) y retorna un reporte
+    con el estado de cada una y números de rendimiento.
+    """
+    import time
+    from collections import Counter
+    from concurrent.futures import ProcessPoolExecutor
+    workers = workers or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    chunksize = max(1, min(256, len(paths) // (workers * 4) or 1))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(public_key_path, check_machine, check_time)) as pool:
+        results = list(pool.map(_verify_batch_item, paths, chunksize=chunksize))
+    elapsed = time.perf_counter() - t0
+    return {
+        'summary': {
+            'total': len(results),
+            'by_status': dict(Counter(r['status'] for r in results)),
+            'workers': workers,
+            'elapsed_seconds': round(elapsed, 3),
+            'licenses_per_second': round(len(results) / elapsed, 1) if elapsed else None,
+            'checks': {'machine_binding': check_machine, 'time_window': check_time},
+            'public_key': public_key_path,
+        },
+        'results': results,
+    }
+
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print("Uso: python license_verifier.py <ruta_license.lic>")
+    import argparse
+    parser = argparse.ArgumentParser(description="Verifica licencias .lic")
+    parser.add_argument("license", nargs="?", help="Ruta a un license.lic")
+    parser.add_argument("--batch", metavar="DIR_O_MANIFIESTO", help="Directorio con .lic o manifiesto de rutas")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos en paralelo (por defecto: núcleos)")
+    parser.add_argument("--public-key", default=PUBLIC_KEY_PATH, help="Ruta a public.key")
+    parser.add_argument("--skip-machine", action="store_true", help="No verificar machine_id")
+    parser.add_argument("--skip-time", action="store_true", help="No verificar fechas de vigencia")
+    parser.add_argument("--output", help="Archivo JSON del reporte (por defecto: stdout)")
+    args = parser.parse_args()
+
+    if args.batch:
+        report = verify_batch(collect_license_paths(args.batch), args.public_key, args.workers,
+                              check_machine=not args.skip_machine, check_time=not args.skip_time)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output)
+            summary = report['summary']
+            print(f"{summary['total']} licencias en {summary['elapsed_seconds']}s "
+                  f"({summary['licenses_per_second']}/s): {summary['by_status']}")
+        else:
+            print(output)
+        exit(0 if set(report['summary']['by_status']) <= {'valid'} else 1)
+
+    if not args.license:
+        print("Uso: python -m public.license_verifier <ruta_license.lic>")
+        print("     python -m public.license_verifier --batch <directorio|manifiesto> [--workers N] [--skip-machine] [--output reporte.json]")
         exit(1)
-    status, reason = verify_license(sys.argv[1])
+    status, reason = verify_license(args.license, args.public_key)
     print(f"Estado: {status}\nMotivo: {reason}")